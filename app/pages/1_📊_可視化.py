@@ -1,17 +1,8 @@
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-import pandas as pd
 import streamlit as st
 
-from app_util.common import COMMON_PAGE_CONFIG, init_session_state
+from app_util.chart import bar_chart_spec, chart_data, render_bar_chart_png
+from app_util.common import COMMON_PAGE_CONFIG, get_comparison, init_session_state
 from app_util.sidebar import error1, sidebar1
-from orchestrator.review import get_pre_info
-from rag_tabular.json_to_db import query_sql_db
-
-mpl.rcParams["font.family"] = "Arial Unicode MS"
-custom_red = (211 / 255, 45 / 255, 64 / 255)  # Ogis R:211, G:45, B:64
-custom_blue = (37 / 255, 90 / 255, 166 / 255)  # Ogis R:37, G:90, B:166
-
 
 # 1. Set the page configuration.
 st.set_page_config(
@@ -33,36 +24,12 @@ error1()
 if (json_obj := st.session_state["json_obj"]) is not None:
     with st.expander("アップロードされたデータ", expanded=False):
         st.write(json_obj)
-    series, df = query_sql_db(json_obj)
-
-    if "算出方法" in df.columns:
-        df.drop(
-            columns=["算出方法"], inplace=True
-        )  # TODO: Do not hardcode the column name
-    if "分類" in df.columns:
-        df.drop(columns=["分類"], inplace=True)  # TODO: Do not hardcode the column name
-    df.set_index("システム", inplace=True)  # TODO: Do not hardcode the column name
-    df = df.T
+    # NOTE: 関連データの表とグラフで同じ比較表を使う
+    comparison = get_comparison(json_obj)
+    df_for_graph = comparison.df
 
     with st.expander("関連データ", expanded=True):
-        st.dataframe(df)
-
-    _, df_for_graph, reference_information = get_pre_info(
-        json_obj=json_obj, bool_current_system=False
-    )
-
-    if "算出方法" in df_for_graph.columns:
-        df_for_graph.drop(
-            columns=["算出方法"], inplace=True
-        )  # TODO: Do not hardcode the column name
-    if "分類" in df_for_graph.columns:
-        df_for_graph.drop(
-            columns=["分類"], inplace=True
-        )  # TODO: Do not hardcode the column name
-    df_for_graph.set_index(
-        "システム", inplace=True
-    )  # TODO: Do not hardcode the column name
-    df_for_graph = df_for_graph.T
+        st.dataframe(df_for_graph)
 
     st.header("指標ごとの比較グラフ")
     exclude_columns = [
@@ -74,45 +41,39 @@ if (json_obj := st.session_state["json_obj"]) is not None:
     selectable_columns = [col for col in json_obj.keys() if col not in exclude_columns]
     selected_column = st.selectbox("比較する指標を選択してください", selectable_columns)
 
+    use_vega = st.toggle(
+        "ブラウザでグラフを描画する",
+        value=False,
+        help="Matplotlibの画像の代わりに、Vega-Liteのグラフを表示します。",
+    )
+
     if selected_column in df_for_graph.index:
         # 現在のシステムと過去のシステムのデータを取得
         current_system = json_obj["システム"]
         if current_system in df_for_graph.columns:
-            current_value = df_for_graph.loc[selected_column, current_system]
-            past_systems = [
-                sys for sys in df_for_graph.columns if sys != current_system
-            ]
-            past_values = df_for_graph.loc[selected_column, past_systems].tolist()
-
             # 棒グラフを表示
-            chart_data = {
-                "システム": [current_system] + past_systems,
-                "値": [current_value] + past_values,
-            }
-            chart_df_for_graph = pd.DataFrame(chart_data)
-            chart_df_for_graph.set_index("システム", inplace=True)
-
-            # 現在のデータの色を変更
-            current_index = chart_df_for_graph.index.tolist().index(current_system)
-            colors = [custom_blue] * len(chart_df_for_graph)
-            colors[current_index] = custom_red
-
-            fig, ax = plt.subplots(figsize=(8, 6))
-            bars = ax.barh(
-                chart_df_for_graph.index, chart_df_for_graph["値"], color=colors
-            )
-            ax.set_yticks(chart_df_for_graph.index)
-            ax.set_yticklabels(chart_df_for_graph.index, ha="right")
-            ax.invert_yaxis()
-            ax.bar_label(
-                bars,
-                labels=[f"{val:.2f}" for val in chart_df_for_graph["値"]],
-                padding=5,
-            )
-            st.pyplot(fig)
+            chart_df = chart_data(df_for_graph, selected_column, current_system)
+            if use_vega:
+                st.altair_chart(
+                    bar_chart_spec(chart_df, current_system), use_container_width=True
+                )
+            else:
+                st.image(
+                    render_bar_chart_png(chart_df, current_system),
+                    use_column_width=True,
+                )
         else:
             st.warning(f"現在のシステム '{current_system}' のデータが見つかりません。")
     else:
         st.warning(f"選択された項目 '{selected_column}' のデータが見つかりません。")
 
+    if selected_column in comparison.summary.index:
+        # NOTE: 全システムの中での位置付けは、ビルド時に集計済み
+        summary = comparison.summary.loc[selected_column]
+        st.caption(
+            f"全{summary['件数']}システム中 百分位: {summary['百分位']:.0%} "
+            f"(最小値 {summary['最小値']:.2f} / 中央値 {summary['中央値']:.2f} / "
+            f"最大値 {summary['最大値']:.2f})"
+        )
+
     # st.scatter_chart(df)
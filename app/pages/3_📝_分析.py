@@ -1,8 +1,14 @@
 import streamlit as st
 
-from app_util.common import ANALYSIS_PROMPT, COMMON_PAGE_CONFIG, init_session_state
+from app_util.common import (
+    ANALYSIS_PROMPT,
+    COMMON_PAGE_CONFIG,
+    get_comparison,
+    init_session_state,
+)
 from app_util.sidebar import error3, sidebar3
-from orchestrator.review import generate_review, get_pre_info, review_agent
+from orchestrator.review import generate_review, review_agent
+from rag_textual.retrieve_from_db import load_db
 
 
 def is_ready_for_analysis() -> bool:
@@ -61,22 +67,9 @@ else:
     )
 
 if (json_obj := st.session_state["json_obj"]) is not None:
-    _, df_for_graph, reference_information = get_pre_info(
-        json_obj=json_obj, bool_current_system=False
-    )
-
-    if "算出方法" in df_for_graph.columns:
-        df_for_graph.drop(
-            columns=["算出方法"], inplace=True
-        )  # TODO: Do not hardcode the column name
-    if "分類" in df_for_graph.columns:
-        df_for_graph.drop(
-            columns=["分類"], inplace=True
-        )  # TODO: Do not hardcode the column name
-    df_for_graph.set_index(
-        "システム", inplace=True
-    )  # TODO: Do not hardcode the column name
-    df_for_graph = df_for_graph.T
+    comparison = get_comparison(json_obj)
+    df_for_graph = comparison.df
+    reference_information = comparison.reference_information
     with st.expander("関連データ", expanded=False):
         st.dataframe(df_for_graph)
 
@@ -115,6 +108,7 @@ if is_ready_for_analysis() and has_started_analysis():
             st.session_state["json_obj"],
             st.session_state["analysis_prompt"],
             st.session_state["api"],
+            comparison=get_comparison(st.session_state["json_obj"]),
         )
         st.session_state["review_messages"].append(
             {"role": "user", "content": prompt_content}
@@ -138,6 +132,9 @@ if (
     and st.session_state["started_analysis"]
     and st.session_state["api"] is not None
 ):
+    # NOTE: ツール呼び出しで使うChromaDBを先にロードしておく (プロセス内で共有される)
+    load_db(st.session_state["api"])
+
     for message in st.session_state["review_messages"][2:]:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
@@ -0,0 +1,65 @@
+"""Benchmark of the render latency of the comparison chart per selection.
+
+Renders the chart of every metric of a system in the 要件定義 phase,
+as the visualization page does when the selector is changed, and reports the
+median latency of the Matplotlib PNG (uncached and cached) and of building
+the Vega-Lite chart (the browser then draws it).
+
+Usage (from the project root)::
+
+    RAG_TAB_PATH=data/2024-01-18/sample.xlsx PYTHONPATH=src \\
+        python bench/app_bench/chart_bench.py
+"""
+
+import json
+import statistics
+import time
+import tracemalloc
+
+from app_util.chart import bar_chart_spec, chart_data, render_bar_chart_png
+from orchestrator.review import build_comparison
+from rag_tabular.excel_to_csv import get_rag_tab_path
+from util.catvar import DevPhase
+
+PHASE = DevPhase.RD
+
+
+def median_ms(latencies: list[float]) -> float:
+    return statistics.median(latencies) * 1e3
+
+
+def main() -> None:
+    json_dir = get_rag_tab_path().parent.joinpath("json")
+    with open(
+        json_dir.joinpath(f"{PHASE.ja}/{PHASE.ja}_00.json"), encoding="utf-8"
+    ) as f:
+        json_obj = json.load(f)
+    df_for_graph = build_comparison(json_obj).df
+    current_system = json_obj["システム"]
+    chart_dfs = [
+        chart_data(df_for_graph, metric, current_system)
+        for metric in df_for_graph.index
+    ]
+    render_bar_chart_png.clear()
+
+    latencies: dict[str, list[float]] = {"png": [], "png (cached)": [], "vega": []}
+    tracemalloc.start()
+    for label in latencies:
+        for chart_df in chart_dfs:
+            start = time.perf_counter()
+            if label == "vega":
+                bar_chart_spec(chart_df, current_system).to_dict()
+            else:
+                render_bar_chart_png(chart_df, current_system)
+            latencies[label].append(time.perf_counter() - start)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{len(chart_dfs)} metrics, {len(df_for_graph.columns)} systems")
+    for label, values in latencies.items():
+        print(f"{label:>13}: {median_ms(values):>8.2f} ms")
+    print(f"peak traced memory: {peak / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark of formatting the review prompt against the size of the past data.
+
+Formats `REVIEW_PROMPT` with synthetic past data in the 要件定義 phase,
+passed as a DataFrame as `generate_review` used to, and reports the median
+latency of formatting it twice (`chain.stream` and then `prompt.format`)
+and once (the messages are reused for the transcript).
+
+Usage (from the project root)::
+
+    RAG_TAB_PATH=data/2024-01-18/sample.xlsx PYTHONPATH=src \\
+        python bench/orchestrator_bench/review_prompt_bench.py
+"""
+
+import json
+import statistics
+import time
+
+import pandas as pd
+
+from orchestrator.review import REVIEW_PROMPT, get_pre_info
+from rag_tabular.excel_to_csv import get_rag_tab_path
+from util.catvar import DevPhase
+
+NUM_SYSTEMS = [10, 100, 1_000, 5_000]
+NUM_REPEATS = 20
+PHASE = DevPhase.RD
+
+
+def median_ms(latencies: list[float]) -> float:
+    return statistics.median(latencies) * 1e3
+
+
+def main() -> None:
+    json_dir = get_rag_tab_path().parent.joinpath("json")
+    with open(
+        json_dir.joinpath(f"{PHASE.ja}/{PHASE.ja}_00.json"), encoding="utf-8"
+    ) as f:
+        json_obj = json.load(f)
+    series, df, reference_information = get_pre_info(json_obj)
+
+    print(f"{'systems':>8} {'twice':>10} {'once':>10}")
+    for num_systems in NUM_SYSTEMS:
+        past_df = pd.concat(
+            [df] * (num_systems // len(df) + 1), ignore_index=True
+        ).iloc[:num_systems]
+        past_df["システム"] = [f"システム{i}" for i in range(num_systems)]
+        variables = {
+            "data": series,
+            "past_data": past_df.T,
+            "phase": series["フェーズ"],
+            "reference_information": reference_information,
+            "statistics": "",
+            "analysisPoint": "",
+        }
+        latencies: dict[str, list[float]] = {"twice": [], "once": []}
+        for _ in range(NUM_REPEATS):
+            start = time.perf_counter()
+            REVIEW_PROMPT.invoke(variables)
+            REVIEW_PROMPT.format(**variables)
+            latencies["twice"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            REVIEW_PROMPT.invoke(variables).to_string()
+            latencies["once"].append(time.perf_counter() - start)
+        print(
+            f"{num_systems:>8} {median_ms(latencies['twice']):>7.2f} ms"
+            f" {median_ms(latencies['once']):>7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark of the lookup latency of `TabularStore.query` against the table size.
+
+Fills a temporary database with synthetic systems in the 要件定義 phase,
+with and without the indexes emitted by `define_tables`, and reports the
+median latency of the query issued by `query_sql_db`.
+
+Usage (from the project root)::
+
+    RAG_TAB_PATH=data/2024-01-18/sample.xlsx PYTHONPATH=src \\
+        python bench/rag_tabular_bench/json_to_db_bench.py
+"""
+
+import json
+import statistics
+import tempfile
+import time
+from itertools import product
+from pathlib import Path
+
+from sqlalchemy import insert
+
+from rag_tabular.excel_to_csv import get_rag_tab_path
+from rag_tabular.json_to_db import TabularStore, define_tables
+from util.catvar import CalcMethod, Classification, DevPhase
+
+NUM_ROWS = [30, 300, 3_000, 30_000, 100_000]
+NUM_REPEATS = 20
+PHASE = DevPhase.RD
+
+
+def build_db(db_path: Path, json_dir: Path, num_rows: int, with_index: bool) -> None:
+    metadata_obj = define_tables(json_dir)
+    if not with_index:
+        for table in metadata_obj.tables.values():
+            table.indexes.clear()
+    store = TabularStore(db_path, json_dir)
+    metadata_obj.create_all(store.engine)
+    table = metadata_obj.tables[PHASE.name]
+    metrics = [
+        column.name for column in table.c if column.name not in table.primary_key
+    ]
+    keys = list(product(CalcMethod, Classification))
+    num_systems = -(-num_rows // len(keys))  # NOTE: 切り上げ
+    rows = [
+        {
+            "システム": f"システム{i}",
+            "算出方法": calc_method.ja,
+            "分類": classification.ja,
+            **{metric: float(i) for metric in metrics},
+        }
+        for i in range(num_systems)
+        for calc_method, classification in keys
+    ][:num_rows]
+    with store.engine.begin() as conn:
+        conn.execute(
+            insert(metadata_obj.tables["systems"]),
+            [{"システム": f"システム{i}"} for i in range(num_systems)],
+        )
+        conn.execute(insert(table), rows)
+    store.dispose()
+
+
+def bench_query(db_path: Path, json_dir: Path, json_obj: dict) -> float:
+    store = TabularStore(db_path, json_dir)
+    store.query(json_obj)  # NOTE: ウォームアップ
+    latencies = []
+    for _ in range(NUM_REPEATS):
+        start = time.perf_counter()
+        store.query(json_obj)
+        latencies.append(time.perf_counter() - start)
+    store.dispose()
+    return statistics.median(latencies)
+
+
+def main() -> None:
+    json_dir = get_rag_tab_path().parent.joinpath("json")
+    with open(
+        json_dir.joinpath(f"{PHASE.ja}/{PHASE.ja}_00.json"), encoding="utf-8"
+    ) as f:
+        json_obj = json.load(f)
+    print(f"{'rows':>8} {'no index [ms]':>14} {'index [ms]':>11}")
+    for num_rows in NUM_ROWS:
+        latencies = []
+        for with_index in (False, True):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                db_path = Path(tmp_dir).joinpath("bench.sqlite3")
+                build_db(db_path, json_dir, num_rows, with_index)
+                latencies.append(bench_query(db_path, json_dir, json_obj))
+        print(f"{num_rows:>8} {latencies[0] * 1e3:>14.2f} {latencies[1] * 1e3:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
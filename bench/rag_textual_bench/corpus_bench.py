@@ -0,0 +1,53 @@
+"""Benchmark of normalizing and chunking a corpus with a process pool.
+
+Copies the IPA whitepaper into a temporary directory as a corpus of several
+documents, and chunks the corpus with 1, 2, 4, ... processes up to the number
+of CPUs. Reports the time and the speedup over a single process.
+
+Usage (from the project root)::
+
+    RAG_TXT_PATH=data/2024-02-29/IPA_2018-2019.txt PYTHONPATH=src \\
+        python bench/rag_textual_bench/corpus_bench.py
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from rag_textual.txt_to_db import TextProcessor, get_rag_txt_path
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+NUM_DOCUMENTS = 8
+SPECIFIC_STRINGS = ["ソフトウェア開発データ白書", "● ソフトウェア開発データ白書"]
+
+
+def main() -> None:
+    processor = TextProcessor(embedding_model=EMBEDDING_MODEL, knowledge_path="")
+    cpu_count = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_paths = [Path(tmp_dir, f"doc{i}.txt") for i in range(NUM_DOCUMENTS)]
+        for file_path in file_paths:
+            shutil.copyfile(get_rag_txt_path(), file_path)
+        baseline = None
+        max_processes = 1
+        while max_processes <= cpu_count:
+            start = time.perf_counter()
+            num_chunks = sum(
+                1
+                for _ in processor.iter_corpus_documents(
+                    file_paths, SPECIFIC_STRINGS, max_processes=max_processes
+                )
+            )
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(
+                f"{max_processes} processes: {num_chunks} chunks in {elapsed:.2f} s "
+                f"(x{baseline / elapsed:.2f})"
+            )
+            max_processes *= 2
+
+
+if __name__ == "__main__":
+    main()
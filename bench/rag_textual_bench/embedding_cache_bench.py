@@ -0,0 +1,52 @@
+"""Benchmark of building the vector database cold and warm.
+
+Splits the IPA whitepaper into chunks and builds two databases in a
+temporary directory, each in its own persist directory as the Docker volumes
+are, sharing one embedding cache. The embeddings are fake, with a latency per
+request as of the embedding API. Reports the build time of the first (cold)
+and the second (warm) build.
+
+Usage (from the project root)::
+
+    RAG_TXT_PATH=data/2024-02-29/IPA_2018-2019.txt PYTHONPATH=src \\
+        python bench/rag_textual_bench/embedding_cache_bench.py
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+from langchain_community.embeddings import FakeEmbeddings
+
+from rag_textual.txt_to_db import TextProcessor, get_rag_txt_path
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+REQUEST_LATENCY = 0.2  # NOTE: 1リクエストあたりの秒数
+
+
+class _SlowEmbeddings(FakeEmbeddings):
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(REQUEST_LATENCY)
+        return super().embed_documents(texts)
+
+
+def main() -> None:
+    with open(get_rag_txt_path(), "r", encoding="utf-8") as file:
+        text = file.read()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        embeddings = _SlowEmbeddings(size=1536)
+        for label in ["cold", "warm"]:
+            processor = TextProcessor(
+                embedding_model=EMBEDDING_MODEL,
+                knowledge_path=str(Path(tmp_dir, f"chroma_db_{label}")),
+                embedding_cache_path=Path(tmp_dir, "embeddings.sqlite3"),
+            )
+            docs = processor.split_text_into_chunks(processor.clean_text(text))
+            start = time.perf_counter()
+            processor.store_documents(docs, embeddings)
+            elapsed = time.perf_counter() - start
+            print(f"{label}: {len(docs)} chunks in {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Accessors to the data cached by Streamlit across reruns and sessions.
+
+The comparison tables are cached as data keyed on the content of the uploaded
+JSON data and on the version of the database file, so that a rerun caused by
+a widget, e.g., a chart selector, does not query the database. The database
+handles themselves are shared within the process by `get_tabular_store` and
+`load_db`, so they are not cached here again.
+"""
+
+import json
+from pathlib import Path
+
+import streamlit as st
+
+from orchestrator.review import Comparison, build_comparison
+from rag_tabular.excel_to_csv import get_rag_tab_path
+from rag_tabular.json_to_db import get_db_path
+
+
+def _db_version(db_path: Path) -> tuple[int, int]:
+    """Returns a value that changes whenever the database file is written."""
+    stat = db_path.stat()
+    return stat.st_ino, stat.st_mtime_ns
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _comparison(json_str: str, db_version: tuple[int, int]) -> Comparison:
+    return build_comparison(json.loads(json_str))
+
+
+def get_cached_comparison(json_obj: dict) -> Comparison:
+    """Returns the comparison for the uploaded data.
+
+    Computed once per content of the uploaded data and version of the database.
+    """
+    db_path = get_db_path(get_rag_tab_path())
+    # NOTE: キーの順序は比較表の行の順序になるので、ソートしない
+    json_str = json.dumps(json_obj, ensure_ascii=False)
+    return _comparison(json_str, _db_version(db_path))
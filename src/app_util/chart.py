@@ -0,0 +1,85 @@
+"""Bar charts comparing a metric of the current system with the past systems."""
+
+import io
+
+import altair as alt
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+import pandas as pd
+import streamlit as st
+
+mpl.rcParams["font.family"] = "Arial Unicode MS"
+custom_red = (211 / 255, 45 / 255, 64 / 255)  # Ogis R:211, G:45, B:64
+custom_blue = (37 / 255, 90 / 255, 166 / 255)  # Ogis R:37, G:90, B:166
+
+
+def chart_data(
+    df_for_graph: pd.DataFrame, selected_column: str, current_system: str
+) -> pd.DataFrame:
+    """Returns the values of the metric, the current system first."""
+    past_systems = [sys for sys in df_for_graph.columns if sys != current_system]
+    systems = [current_system] + past_systems
+    chart_df = pd.DataFrame(
+        {
+            "システム": systems,
+            "値": df_for_graph.loc[selected_column, systems].tolist(),
+        }
+    )
+    chart_df.set_index("システム", inplace=True)
+    return chart_df
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def render_bar_chart_png(chart_df: pd.DataFrame, current_system: str) -> bytes:
+    """Renders the bar chart with Matplotlib and returns it as PNG.
+
+    Cached by the system and the values (thus the metric and the version of
+    the data). The figure is closed right after rendering.
+    """
+    # 現在のデータの色を変更
+    current_index = chart_df.index.tolist().index(current_system)
+    colors = [custom_blue] * len(chart_df)
+    colors[current_index] = custom_red
+
+    fig, ax = plt.subplots(figsize=(8, 6))
+    try:
+        bars = ax.barh(chart_df.index, chart_df["値"], color=colors)
+        ax.set_yticks(chart_df.index)
+        ax.set_yticklabels(chart_df.index, ha="right")
+        ax.invert_yaxis()
+        ax.bar_label(
+            bars,
+            labels=[f"{val:.2f}" for val in chart_df["値"]],
+            padding=5,
+        )
+        buf = io.BytesIO()
+        # NOTE: st.pyplotと同じ設定
+        fig.savefig(buf, format="png", bbox_inches="tight", dpi=200)
+    finally:
+        plt.close(fig)  # NOTE: 閉じないと再実行のたびにメモリが増える
+    return buf.getvalue()
+
+
+def bar_chart_spec(chart_df: pd.DataFrame, current_system: str) -> alt.LayerChart:
+    """Returns the bar chart as a Vega-Lite chart drawn by the browser."""
+    source = chart_df.reset_index()
+    source["現在のシステム"] = source["システム"] == current_system
+    order = source["システム"].tolist()
+    base = alt.Chart(source).encode(
+        x=alt.X("値:Q", title=None),
+        y=alt.Y("システム:N", sort=order, title=None),
+    )
+    bars = base.mark_bar().encode(
+        color=alt.Color(
+            "現在のシステム:N",
+            scale=alt.Scale(
+                domain=[True, False],
+                range=[mpl.colors.to_hex(custom_red), mpl.colors.to_hex(custom_blue)],
+            ),
+            legend=None,
+        )
+    )
+    labels = base.mark_text(align="left", dx=5).encode(
+        text=alt.Text("値:Q", format=".2f")
+    )
+    return bars + labels
@@ -1,7 +1,13 @@
 """Utilities common to all pages."""
 
+import hashlib
+import json
+
 import streamlit as st
 
+from app_util.cache import get_cached_comparison
+from orchestrator.review import Comparison
+
 # "🏠ホーム"ページに表示する機能説明
 HOME_MARKDOWN = """
 データの可視化機能、AIとのチャット機能、およびシステムデータの分析機能を利用できます。
@@ -31,7 +37,7 @@ HOME_MARKDOWN = """
 ANALYSIS_PROMPT = (
     "1. 現在のデータと過去のデータに含まれる指標を比較し、優れている点や改善が必要な点を具体的に指摘してください。"
     "    その際、はじめに注目すべき指標について述べ、その後Markdown形式で表を用いて視覚的にわかりやすく示してください。可能な限り、様々な指標についての比較を行ってください。\n\n"
-    "2. IPA参照項目に記載されている統計量と現在のデータを比較し、プロジェクトの位置付けを評価してください。根拠となる計算結果を明示してください。\n\n"
+    "2. IPA参照項目に記載されている統計量と現在のデータを比較し、プロジェクトの位置付けを評価してください。根拠として計算結果の数値を明示してください。\n\n"
     "3. 現在のデータの解釈や改善案の提示を行ってください。"
     "    その際、プロジェクトの背景情報（システムの特性や制約条件など）を具体的に考慮し、それらを踏まえた改善案を提示してください。\n\n"
     "4. レビューを通じて発見した課題や問題点について、優先度を考慮しながら具体的な改善策を提案してください。改善案には優先順位を付けてください。\n\n"
@@ -65,3 +71,25 @@ def init_session_state():
         st.session_state["data_file_size"] = None
     if "api" not in st.session_state:
         st.session_state["api"] = None
+    # NOTE: 比較表は再実行 (rerun) ごとに1回だけ作る
+    st.session_state["comparison"] = None
+
+
+def json_obj_key(json_obj: dict) -> tuple[str, str]:
+    """Returns (hash of the content, phase) of the uploaded data."""
+    json_str = json.dumps(json_obj, ensure_ascii=False)
+    return hashlib.sha256(json_str.encode("utf-8")).hexdigest(), json_obj["フェーズ"]
+
+
+def get_comparison(json_obj: dict) -> Comparison:
+    """Returns the comparison for the uploaded data, looked up once per rerun.
+
+    The comparison itself is cached across reruns by `get_cached_comparison`.
+    `init_session_state` must have been called in the current rerun.
+    """
+    key = json_obj_key(json_obj)
+    if (cached := st.session_state["comparison"]) is not None and cached[0] == key:
+        return cached[1]
+    comparison = get_cached_comparison(json_obj)
+    st.session_state["comparison"] = (key, comparison)
+    return comparison
@@ -0,0 +1,120 @@
+"""Compact serialization of the current and past data for the review prompt.
+
+The data used to be interpolated through the `str()` of pandas, which pads
+with whitespace, truncates wide frames and grows with every past system.
+Here they are serialized as CSV, and the past systems are included from the
+most similar one until the token budget is spent.
+
+The similarity is the mean squared difference over the metrics both systems
+have, each metric standardized by its standard deviation among the past
+systems.
+"""
+
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from orchestrator.review_stats import metric_columns
+from util.tokenizer import get_encoding
+
+PAST_DATA_TOKEN_BUDGET = 3000  # NOTE: 過去のデータに使うトークン数の上限 (既定値)
+FALLBACK_ENCODING = "o200k_base"  # NOTE: tiktokenが知らないモデルのエンコーディング
+FLOAT_FORMAT = "%.6g"
+
+
+def get_past_data_token_budget() -> int:
+    """Returns the number of tokens that the past data may take in the prompt.
+
+    Set by the environment variable `REVIEW_PAST_DATA_TOKENS`,
+    `PAST_DATA_TOKEN_BUDGET` if unset.
+    """
+    _budget: str | None = os.getenv("REVIEW_PAST_DATA_TOKENS")
+    if _budget is None:
+        return PAST_DATA_TOKEN_BUDGET
+    try:
+        return int(_budget)
+    except ValueError:
+        raise ValueError("環境変数REVIEW_PAST_DATA_TOKENSには整数を設定してください。")
+
+
+def count_tokens(text: str, model_name: str) -> int:
+    return len(get_encoding(model_name, FALLBACK_ENCODING).encode(text))
+
+
+def serialize_current_data(series: pd.Series) -> str:
+    """Returns the current data as CSV of the items and their values."""
+    series = series.dropna().rename_axis("項目").rename("値")
+    return series.to_csv(float_format=FLOAT_FORMAT).strip()
+
+
+def serialize_past_data(df: pd.DataFrame) -> str:
+    """Returns the past data as CSV of the metrics (rows) and systems (columns).
+
+    The columns other than the metrics, equal for all the rows, are dropped.
+    """
+    table = df.set_index("システム")[metric_columns(df)].T.dropna(how="all")
+    table = table.rename_axis("指標")
+    return table.to_csv(float_format=FLOAT_FORMAT).strip()
+
+
+def similarity_order(series: pd.Series, df: pd.DataFrame) -> np.ndarray:
+    """Returns the positions of the rows of `df`, the most similar first."""
+    metrics = [metric for metric in metric_columns(df) if metric in series.index]
+    current = pd.to_numeric(series[metrics], errors="coerce").to_numpy(dtype=float)
+    past = df[metrics].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        # NOTE: 比較できる指標がない行は最後にする
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        std = np.nanstd(past, axis=0)
+        scale = np.where(std > 0, std, 1.0)
+        distance = np.nanmean(((past - current) / scale) ** 2, axis=1)
+    distance = np.where(np.isnan(distance), np.inf, distance)
+    return np.argsort(distance, kind="stable")
+
+
+def build_past_data(
+    series: pd.Series, df: pd.DataFrame, model_name: str, token_budget: int
+) -> tuple[str, int]:
+    """Returns the past data within the budget and the number of systems in it.
+
+    The most similar past systems are kept, as many as fit in `token_budget`
+    (at least one, if any).
+    """
+    if df.empty:
+        return serialize_past_data(df), 0
+    df = df.iloc[similarity_order(series, df)]
+
+    def fits(n: int) -> bool:
+        text = serialize_past_data(df.iloc[:n])
+        return count_tokens(text, model_name) <= token_budget
+
+    # NOTE: トークン数はシステム数に対して単調なので二分探索する
+    if fits(len(df)):
+        n = len(df)
+    else:
+        low, high = 1, len(df) - 1
+        while low < high:
+            mid = (low + high + 1) // 2
+            if fits(mid):
+                low = mid
+            else:
+                high = mid - 1
+        n = low
+    return serialize_past_data(df.iloc[:n]), n
+
+
+def build_prompt_context(
+    series: pd.Series,
+    df: pd.DataFrame,
+    model_name: str,
+    token_budget: int | None = None,
+) -> dict[str, str]:
+    """Returns the current and past data for the variables of the prompt."""
+    if token_budget is None:
+        token_budget = get_past_data_token_budget()
+    past_data, n = build_past_data(series, df, model_name, token_budget)
+    if n < len(df):
+        past_data = f"(類似する{n}件/全{len(df)}件)\n{past_data}"
+    return {"data": serialize_current_data(series), "past_data": past_data}
@@ -1,14 +1,21 @@
+import asyncio
 import json
+import threading
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Any
 
 import langchain
 import openai
 import pandas as pd
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompt_values import PromptValue
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import AzureChatOpenAI, ChatOpenAI
 
-from rag_tabular.json_to_db import query_sql_db
+from orchestrator.prompt_context import build_prompt_context
+from orchestrator.review_stats import format_review_statistics
+from rag_tabular.json_to_db import query_metric_summary, query_sql_db
 from rag_textual.retrieve_from_db import load_db, retrieve_documents
 from util.api import API
 from util.catvar import DevPhase
@@ -22,35 +29,88 @@ langchain.debug = False  # type: ignore[attr-defined]
 langchain.llm_cache = None  # type: ignore[attr-defined]
 
 
-def _load_reference_json_file(file_path: Path) -> dict:
+class _FrozenDict(dict):
+    """Read-only dict, printed (and thus prompted) like a dict."""
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("参照項目の情報は変更できません。")
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return (_FrozenDict, (dict(self),))
+
+
+class _FrozenList(list):
+    """Read-only list, printed (and thus prompted) like a list."""
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("参照項目の情報は変更できません。")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = clear = extend = insert = pop = remove = reverse = sort = _immutable
+
+    def __reduce__(self):
+        return (_FrozenList, (list(self),))
+
+
+def _freeze(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return _FrozenDict((key, _freeze(value)) for key, value in obj.items())
+    if isinstance(obj, list):
+        return _FrozenList(_freeze(value) for value in obj)
+    return obj
+
+
+def _load_reference_json_file(file_path: Path) -> Any:
     with open(file_path, "r", encoding="utf-8") as file:
         data = json.load(file)
-    return data
-
-
-def get_reference(series: pd.Series) -> dict:
-    if series["フェーズ"] == DevPhase.RD.ja:
-        return _load_reference_json_file(
-            REFERENCE_DIR.joinpath("要件定義_参照項目.json")
-        )
-    elif series["フェーズ"] == DevPhase.DES1.ja:
-        return _load_reference_json_file(
-            REFERENCE_DIR.joinpath("基本設計_参照項目.json")
-        )
-    elif series["フェーズ"] == DevPhase.DES2.ja:
-        return _load_reference_json_file(
-            REFERENCE_DIR.joinpath("詳細設計_参照項目.json")
-        )
-    elif series["フェーズ"] == DevPhase.IMPL.ja:
-        return _load_reference_json_file(
-            REFERENCE_DIR.joinpath("実装・単テ_参照項目.json")
-        )
-    elif series["フェーズ"] == DevPhase.INT.ja:
-        return _load_reference_json_file(REFERENCE_DIR.joinpath("結テ_参照項目.json"))
-    elif series["フェーズ"] == DevPhase.ST.ja:
-        return _load_reference_json_file(REFERENCE_DIR.joinpath("ST_参照項目.json"))
-    else:
-        raise ValueError(f"Unknown phase: {series['フェーズ']}")
+    return _freeze(data)
+
+
+class ReferenceRegistry:
+    """Reference information of each phase, loaded once and kept read-only.
+
+    A file is loaded on first use (or by `preload`) and reloaded only if it
+    has been modified since.
+    """
+
+    def __init__(self, reference_dir: Path):
+        self.reference_dir = reference_dir
+        # NOTE: フェーズ -> (ファイルの更新時刻, 参照項目の情報)
+        self._references: dict[DevPhase, tuple[int, Any]] = {}
+        self._lock = threading.Lock()
+
+    def file_path(self, phase: DevPhase) -> Path:
+        return self.reference_dir.joinpath(f"{phase.ja}_参照項目.json")
+
+    def get(self, phase: DevPhase) -> Any:
+        file_path = self.file_path(phase)
+        mtime = file_path.stat().st_mtime_ns
+        with self._lock:
+            if phase in self._references:
+                loaded_mtime, reference = self._references[phase]
+                if loaded_mtime == mtime:
+                    return reference
+            reference = _load_reference_json_file(file_path)
+            self._references[phase] = (mtime, reference)
+            return reference
+
+    def preload(self) -> None:
+        for phase in DevPhase:
+            self.get(phase)
+
+
+reference_registry = ReferenceRegistry(REFERENCE_DIR)
+
+
+def get_reference(series: pd.Series) -> Any:
+    try:
+        phase = DevPhase.from_ja(series["フェーズ"])
+    except ValueError:
+        raise ValueError(f"Unknown phase: {series['フェーズ']}") from None
+    return reference_registry.get(phase)
 
 
 def get_pre_info(json_obj: dict, bool_current_system: bool = True):
@@ -66,52 +126,139 @@ def get_pre_info(json_obj: dict, bool_current_system: bool = True):
     return series, df, reference_information
 
 
-def generate_review(
+# NOTE: 比較表では行にしない列
+COMPARISON_EXCLUDE_COLUMNS = ("算出方法", "分類")
+
+
+@dataclass(frozen=True)
+class Comparison:
+    """The uploaded data and what it is compared with on the pages."""
+
+    series: pd.Series  # NOTE: 現在のデータ (フェーズを含む)
+    rows: pd.DataFrame  # NOTE: データベースから取得した行 (現在のシステムを含む)
+    df: pd.DataFrame  # NOTE: 指標 x システムの表 (現在のシステムを含む)
+    reference_information: Any  # NOTE: 参照項目の情報
+    summary: pd.DataFrame  # NOTE: 指標ごとの集計と現在のデータの百分位
+
+    def pre_info(self) -> tuple[pd.Series, pd.DataFrame, Any]:
+        """Returns what `get_pre_info` returns, excluding the current system."""
+        df = self.rows[self.rows["システム"] != self.series["システム"]]
+        return self.series, df, self.reference_information
+
+
+def build_comparison(json_obj: dict) -> Comparison:
+    series, rows, reference_information = get_pre_info(
+        json_obj=json_obj, bool_current_system=False
+    )
+    df = rows.drop(
+        columns=[column for column in COMPARISON_EXCLUDE_COLUMNS if column in rows]
+    )
+    df = df.set_index("システム").T
+    summary = query_metric_summary(json_obj)
+    return Comparison(series, rows, df, reference_information, summary)
+
+
+REVIEW_PROMPT = ChatPromptTemplate.from_template(
+    "あなたは渡されたデータのレビューを行うAIアシスタントです。\n"
+    "現在のデータは次のものです。\n"
+    "<現在のデータ>{data}</現在のデータ>\n"
+    "過去のデータは次のものです。\n"
+    "<過去のデータ>{past_data}</過去のデータ>\n"
+    "現在の開発フェーズ[{phase}]にて比較を行う上で"
+    "参考可能なソフトウェア開発データ白書2018-2019に記載されている参照項目は下のものです。\n"
+    "<参照項目>{reference_information}</参照項目>\n"
+    "現在のデータと過去のデータ・参照項目の統計量を比較した計算結果は次のものです。\n"
+    "<計算結果>{statistics}</計算結果>\n"
+    "比較に用いる数値は計算し直さず、計算結果の値をそのまま引用してください。\n"
+    "現在のデータと参照項目の比較と、現在のデータと過去のデータの比較を、以下の手順でレビューを行なってください。\n"
+    "{analysisPoint}\n"
+    "以上の点を踏まえ、現在のデータの表示、過去データや参照項目との比較を行い、回答を提示してください。\n"
+    "あなたの全ての出力はMarkdown形式で整形してください。\n"
+    "見出しには'##'などを使用し、内容に沿った絵文字を見出しの後ろに使用してください。\n"
+    "見出しごとに'***'で水平線を使用して区切ってください。\n "
+    "文章内においては、指標名を'`'を使用して出力して下さい。\n"
+    "'多い、高い、長い、上回る'などの文章の直後には、矢印などの絵文字を使用して視覚的に分かりやすくしてください。\n"
+    "'少ない、低い、短い、下回る'などの文章の直後には、矢印などの絵文字を使用して視覚的に分かりやすくしてください。\n"
+    "数値に関しては、'**'を使用して出力してください。"
+)
+
+
+def build_review_prompt(
     json_obj: dict,
     analysisPoint: str,
-    api: API,
-):
-    series, df, reference_information = get_pre_info(json_obj=json_obj)
-    chat: ChatOpenAI | AzureChatOpenAI = api.init_chat_model()
-    prompt = ChatPromptTemplate.from_template(
-        "あなたは渡されたデータのレビューを行うAIアシスタントです。\n"
-        "現在のデータは次のものです。\n"
-        "<現在のデータ>{data}</現在のデータ>\n"
-        "過去のデータは次のものです。\n"
-        "<過去のデータ>{past_data}</過去のデータ>\n"
-        "現在の開発フェーズ[{phase}]にて比較を行う上で"
-        "参考可能なソフトウェア開発データ白書2018-2019に記載されている参照項目は下のものです。\n"
-        "<参照項目>{reference_information}</参照項目>\n"
-        "現在のデータと参照項目の比較と、現在のデータと過去のデータの比較を、以下の手順でレビューを行なってください。\n"
-        "{analysisPoint}\n"
-        "以上の点を踏まえ、現在のデータの表示、過去データや参照項目との比較を行い、回答を提示してください。\n"
-        "あなたの全ての出力はMarkdown形式で整形してください。\n"
-        "見出しには'##'などを使用し、内容に沿った絵文字を見出しの後ろに使用してください。\n"
-        "見出しごとに'***'で水平線を使用して区切ってください。\n "
-        "文章内においては、指標名を'`'を使用して出力して下さい。\n"
-        "'多い、高い、長い、上回る'などの文章の直後には、矢印などの絵文字を使用して視覚的に分かりやすくしてください。\n"
-        "'少ない、低い、短い、下回る'などの文章の直後には、矢印などの絵文字を使用して視覚的に分かりやすくしてください。\n"
-        "数値に関しては、'**'を使用して出力してください。"
-    )
+    model_name: str,
+    comparison: Comparison | None = None,
+    token_budget: int | None = None,
+) -> PromptValue:
+    """Returns the messages of the review, formatted once.
 
-    output_parser = StrOutputParser()
-    chain = prompt | chat | output_parser
-    response = chain.stream(
+    The same messages are sent to the model and returned as the transcript.
+    """
+    if comparison is None:
+        series, df, reference_information = get_pre_info(json_obj=json_obj)
+    else:
+        series, df, reference_information = comparison.pre_info()
+    statistics = format_review_statistics(series, df, reference_information)
+    # NOTE: 過去のデータは類似するものからトークン数の上限まで
+    context = build_prompt_context(series, df, model_name, token_budget=token_budget)
+    return REVIEW_PROMPT.invoke(
         {
-            "data": series,  # NOTE: 現在のデータ
-            "past_data": df.T,  # NOTE:　過去の関連データ
+            "data": context["data"],  # NOTE: 現在のデータ
+            "past_data": context["past_data"],  # NOTE:　過去の関連データ
             "phase": series["フェーズ"],  # NOTE: 現在のフェーズ
             "reference_information": reference_information,  # NOTE: 参照項目の情報
+            "statistics": statistics,  # NOTE: 比較の計算結果
             "analysisPoint": analysisPoint,  # NOTE: 分析の観点
         }
     )
-    prompt_content = prompt.format(
-        data=series,
-        past_data=df.T,
-        phase=series["フェーズ"],
-        reference_information=reference_information,
-        analysisPoint=analysisPoint,
+
+
+def generate_review(
+    json_obj: dict,
+    analysisPoint: str,
+    api: API,
+    comparison: Comparison | None = None,
+    token_budget: int | None = None,
+):
+    prompt_value = build_review_prompt(
+        json_obj,
+        analysisPoint,
+        api.config.chat_model_name,
+        comparison=comparison,
+        token_budget=token_budget,
+    )
+    chat: ChatOpenAI | AzureChatOpenAI = api.init_chat_model()
+    output_parser = StrOutputParser()
+    chain = chat | output_parser
+    response = chain.stream(prompt_value)
+    prompt_content = prompt_value.to_string()
+    return response, prompt_content
+
+
+async def agenerate_review(
+    json_obj: dict,
+    analysisPoint: str,
+    api: API,
+    comparison: Comparison | None = None,
+    token_budget: int | None = None,
+):
+    """Async counterpart of `generate_review`, streamed with `astream`.
+
+    The prompt is built in a worker thread, as it queries the database.
+    """
+    prompt_value = await asyncio.to_thread(
+        build_review_prompt,
+        json_obj,
+        analysisPoint,
+        api.config.chat_model_name,
+        comparison=comparison,
+        token_budget=token_budget,
     )
+    chat: ChatOpenAI | AzureChatOpenAI = api.init_async_chat_model()
+    output_parser = StrOutputParser()
+    chain = chat | output_parser
+    response = chain.astream(prompt_value)
+    prompt_content = prompt_value.to_string()
     return response, prompt_content
 
 
@@ -192,6 +339,45 @@ def _chat_completion_response(
     return stream
 
 
+async def _aexecute_function_call(function_info: dict, api: API):
+    # NOTE: ChromaDBの検索はブロックするので、ワーカースレッドで実行する
+    return await asyncio.to_thread(_execute_function_call, function_info, api)
+
+
+async def _achat_completion_request(
+    messages,
+    api: API,
+    tools=None,
+    tool_choice="auto",
+):
+    client: openai.AsyncOpenAI | openai.AsyncAzureOpenAI = (
+        api.init_async_openai_client()
+    )
+    response = await client.chat.completions.create(
+        model=api.config.chat_model_name,
+        messages=messages,
+        tools=tools,
+        tool_choice=tool_choice,
+        stream=True,
+    )
+    return response
+
+
+async def _achat_completion_response(
+    messages,
+    api: API,
+):
+    client: openai.AsyncOpenAI | openai.AsyncAzureOpenAI = (
+        api.init_async_openai_client()
+    )
+    stream = await client.chat.completions.create(
+        model=api.config.chat_model_name,
+        messages=messages,
+        stream=True,
+    )
+    return stream
+
+
 def review_agent(
     messages,
     api: API,
@@ -236,3 +422,52 @@ def review_agent(
         else:  # NOTE: 通常のレスポンスが選択された場合
             yield chunk
             yield from function_stream
+
+
+async def areview_agent(
+    messages,
+    api: API,
+):
+    """Async counterpart of `review_agent`."""
+    function_info = {
+        "name": None,
+        "arguments": "",
+    }
+    function_stream = await _achat_completion_request(
+        messages,
+        api,
+        tools=TOOLS,
+        tool_choice="auto",
+    )
+    async for chunk in function_stream:
+        if len(chunk.choices) == 0:
+            continue
+        if chunk.choices[0].delta.content is None:  # NOTE: function callingが選択された
+            function_call = chunk.choices[0].delta.tool_calls
+            if function_call:
+                if (
+                    function_call[0].function.name is not None
+                    and function_call[0].function.name != ""
+                ):
+                    function_info["name"] = function_call[0].function.name
+                if (
+                    function_call[0].function.arguments is not None
+                    and function_call[0].function.arguments != ""
+                ):
+                    function_info["arguments"] += function_call[0].function.arguments
+            if chunk.choices[0].finish_reason == "tool_calls":
+                results = await _aexecute_function_call(function_info, api)
+                messages.append(
+                    {
+                        "role": "function",
+                        "name": function_info["name"],
+                        "content": str(results),
+                    }
+                )
+                chat_stream = await _achat_completion_response(messages, api)
+                async for chat_chunk in chat_stream:
+                    yield chat_chunk
+        else:  # NOTE: 通常のレスポンスが選択された場合
+            yield chunk
+            async for rest_chunk in function_stream:
+                yield rest_chunk
@@ -0,0 +1,212 @@
+"""Statistics of the current data computed for the review prompt.
+
+The chat model used to compare the current data with the past data and the
+reference information by itself. The comparisons are computed here instead,
+with NumPy over all the metrics at once, and passed to the model as a compact
+table:
+
+- against the past systems: the mean, the median, the difference from the
+  mean, the z-score and the percentile rank (the fraction of the past systems
+  whose value is less than or equal to the current value, as in
+  `rag_tabular.summary`);
+- against the reference information: the statistics of the figure of
+  ソフトウェア開発データ白書2018-2019 that corresponds to the metric, the
+  difference from the median, the z-score and the percentile rank
+  interpolated between the quartiles.
+"""
+
+import re
+import warnings
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from util.catvar import DevPhase
+
+# NOTE: 指標ではない列
+NON_METRIC_COLUMNS = ("フェーズ", "システム", "算出方法", "分類")
+
+# NOTE: 参照項目の統計量の列
+REFERENCE_STAT_COLUMNS = ("N", "最小", "P25", "中央", "P75", "最大", "平均", "標準偏差")
+
+# NOTE: 指標 -> (参照項目の図表番号, 図表の行 (工程)).
+# 単位が同じものだけを対応させる (1人月 = 160人時)
+REFERENCE_METRICS: dict[DevPhase, dict[str, tuple[str, str | None]]] = {
+    DevPhase.RD: {},
+    DevPhase.DES1: {
+        "投下工数_工数(人時)": ("図表 7-4-2", None),
+        "指摘件数_(件)": ("図表 7-3-5", None),
+        "レビュー1人月あたり_指摘件数_(件)": ("図表 7-3-4", None),
+    },
+    DevPhase.DES2: {
+        "投下工数_工数(人時)": ("図表 7-4-5", None),
+        "指摘件数_(件)": ("図表 7-3-10", None),
+        "レビュー1人月あたり_指摘件数_(件)": ("図表 7-3-9", None),
+    },
+    DevPhase.IMPL: {
+        "コードレビュー指摘効率_件/人月": ("図表 7-3-12", None),
+    },
+    DevPhase.INT: {
+        "テストケース密度_密度": ("図表 7-5-27", "結合テスト（テストケース）"),
+        "不具合密度_密度": ("図表 7-5-27", "結合テスト検出バグ数（現象）"),
+    },
+    DevPhase.ST: {
+        "テストケース密度_密度": ("図表 7-5-27", "総合テスト（テストケース）"),
+        "不具合密度_密度": ("図表 7-5-27", "総合テスト検出バグ数（現象）"),
+    },
+}
+
+_FIGURE_PATTERN = re.compile(r"図表\s*[\d-]+")
+
+
+def _parse_markdown_row(line: str) -> list[str]:
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+def parse_reference_tables(
+    reference_information: Any,
+) -> dict[str, pd.DataFrame]:
+    """Returns the statistics tables of the reference information.
+
+    The keys are the figure numbers, e.g. "図表 7-4-2", and each table has
+    the rows of the figure (indexed by 工程, or None if the figure has one row)
+    and the columns `REFERENCE_STAT_COLUMNS` as floats.
+    """
+    tables: dict[str, pd.DataFrame] = {}
+    for document in reference_information:
+        page_content = document.get("page_content") or ""
+        match = _FIGURE_PATTERN.search(page_content)
+        if match is None:
+            continue
+        lines = [line for line in page_content.splitlines() if line.startswith("|")]
+        if len(lines) < 3:
+            continue
+        header = _parse_markdown_row(lines[0])
+        records = []
+        for line in lines[2:]:  # NOTE: 2行目は区切り
+            cells = dict(zip(header, _parse_markdown_row(line)))
+            records.append(
+                {
+                    "工程": cells.get("工程"),
+                    **{
+                        column: float(cells[column].replace(",", ""))
+                        for column in REFERENCE_STAT_COLUMNS
+                    },
+                }
+            )
+        figure = re.sub(r"\s+", " ", match.group())
+        tables[figure] = pd.DataFrame.from_records(records).set_index("工程")
+    return tables
+
+
+def metric_columns(df: pd.DataFrame) -> list[str]:
+    return [column for column in df.columns if column not in NON_METRIC_COLUMNS]
+
+
+def compare_with_past(series: pd.Series, df: pd.DataFrame) -> pd.DataFrame:
+    """Returns the statistics of each metric of `series` against the rows of `df`.
+
+    `df` holds the past systems only. A metric that none of them has gets NaN.
+    """
+    metrics = [metric for metric in metric_columns(df) if metric in series.index]
+    current = pd.to_numeric(series[metrics], errors="coerce").to_numpy(dtype=float)
+    past = df[metrics].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    observed = ~np.isnan(past)
+    count = observed.sum(axis=0)
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        # NOTE: 過去のデータがない指標は NaN にする
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        mean = np.nanmean(past, axis=0)
+        median = np.nanmedian(past, axis=0)
+        std = np.nanstd(past, axis=0, ddof=1)
+        delta = current - mean
+        z_score = np.where(std > 0, delta / std, np.nan)
+        percentile_rank = np.where(
+            count > 0,
+            (observed & (past <= current)).sum(axis=0) / count,
+            np.nan,
+        )
+    percentile_rank[np.isnan(current)] = np.nan
+    return pd.DataFrame(
+        {
+            "値": current,
+            "件数": count,
+            "平均": mean,
+            "中央値": median,
+            "平均との差": delta,
+            "z": z_score,
+            "百分位": percentile_rank,
+        },
+        index=pd.Index(metrics, name="指標"),
+    )
+
+
+def compare_with_reference(
+    series: pd.Series, reference_information: Any
+) -> pd.DataFrame:
+    """Returns the statistics of each metric of `series` against the reference.
+
+    Only the metrics in `REFERENCE_METRICS` whose figure is found in the
+    reference information are compared. The percentile rank is interpolated
+    linearly between 最小, P25, 中央, P75 and 最大.
+    """
+    phase = DevPhase.from_ja(series["フェーズ"])
+    tables = parse_reference_tables(reference_information)
+    records = []
+    for metric, (figure, row) in REFERENCE_METRICS[phase].items():
+        if metric not in series.index or figure not in tables:
+            continue
+        table = tables[figure]
+        if row is None:
+            stats = table.iloc[0]
+        elif row in table.index:
+            stats = table.loc[row]
+        else:
+            continue
+        records.append(
+            {"指標": metric, "図表": figure, "値": series[metric], **stats.to_dict()}
+        )
+    columns = ["指標", "図表", "値", *REFERENCE_STAT_COLUMNS]
+    df = pd.DataFrame.from_records(records, columns=columns).set_index("指標")
+    value = pd.to_numeric(df["値"], errors="coerce").to_numpy(dtype=float)
+    quantiles = df[["最小", "P25", "中央", "P75", "最大"]].to_numpy(dtype=float)
+    mean = df["平均"].to_numpy(dtype=float)
+    std = df["標準偏差"].to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z_score = np.where(std > 0, (value - mean) / std, np.nan)
+    percentile_rank = np.array(
+        [
+            np.nan if np.isnan(v) else np.interp(v, q, [0, 0.25, 0.5, 0.75, 1])
+            for v, q in zip(value, quantiles)
+        ],
+        dtype=float,
+    )
+    return df.assign(
+        中央との差=value - df["中央"].to_numpy(dtype=float),
+        z=z_score,
+        百分位=percentile_rank,
+    )
+
+
+def _format(df: pd.DataFrame) -> str:
+    return df.to_csv(float_format="%.4g", na_rep="-").strip()
+
+
+def format_review_statistics(
+    series: pd.Series, df: pd.DataFrame, reference_information: Any
+) -> str:
+    """Returns the comparisons as compact CSV tables for the prompt."""
+    past_stats = compare_with_past(series, df)
+    past_stats = past_stats[past_stats["値"].notna()]
+    text = f"過去のデータとの比較 (件数={len(df)}):\n{_format(past_stats)}"
+    reference_stats = compare_with_reference(series, reference_information)
+    if not reference_stats.empty:
+        reference_stats = reference_stats[
+            [
+                *["図表", "値", "P25", "中央", "P75", "平均", "標準偏差"],
+                *["中央との差", "z", "百分位"],
+            ]
+        ]
+        text += f"\n\n参照項目との比較:\n{_format(reference_stats)}"
+    return text
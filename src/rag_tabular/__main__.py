@@ -3,16 +3,18 @@
 Converts the Excel file,
 as specified by the environment variable `RAG_TAB_PATH`,
 to a SQLite database file in the same directory.
-Along the way, the Excel file is first converted to CSV files,
-then the CSV files are converted to intermediate JSON files,
-and finally the JSON files are converted to a SQLite database file.
+Each sheet of the Excel file is read once and inserted into the database
+directly, and the JSON schemata are saved in the `json` directory.
+If the database already exists, only the rows that changed are written,
+unless `--full-rebuild` is given.
+With `--emit-csv` and `--emit-json`, the intermediate CSV files and JSON
+instances of the step-by-step pipeline
+(`excel_to_csv`, `csv_to_json` and `json_to_db`) are saved as well.
 
 For example, if the Excel file is `/foo/bar.xlsx`,
 then the SQLite database file will be `/foo/bar.sqlite3`.
 """
 
-from rag_tabular import csv_to_json, excel_to_csv, json_to_db
+from rag_tabular import excel_to_db
 
-excel_to_csv.main()
-csv_to_json.main()
-json_to_db.main()
+excel_to_db.main()
@@ -10,15 +10,29 @@ from util.catvar import DevPhase
 
 
 def save_json_obj(json_obj: dict[str, Any], json_path: Path) -> None:
+    json_str = json.dumps(json_obj, ensure_ascii=False, indent=4)
+    json_str += "\n"  # Add newline at the end
     if json_path.exists():
+        # NOTE: 内容が変わらないファイルは書き換えない
+        with io.open(json_path, "r", encoding="utf-8") as json_file:
+            if json_file.read() == json_str:
+                return
         json_path.unlink()
         print(f"Deleted {json_path.resolve()}")
     with io.open(json_path, "w", encoding="utf-8") as json_file:
-        json.dump(json_obj, json_file, ensure_ascii=False, indent=4)
-        json_file.write("\n")  # Add newline at the end
+        json_file.write(json_str)
     print(f"Created {json_path.resolve()}")
 
 
+def dataframe_to_json_instances(
+    df: pd.DataFrame, phase: DevPhase
+) -> list[dict[str, Any]]:
+    """Converts the rows of a DataFrame to JSON instances of the phase."""
+    # NOTE: NaNはnullに、数値は小数点以下10桁に変換される
+    json_str: str = df.to_json(force_ascii=False, orient="records")
+    return [{"フェーズ": phase.ja, **json_obj} for json_obj in json.loads(json_str)]
+
+
 def csv_to_json_instance(data_dir: Path, json_dir: Path | None = None):
     csv_dir = data_dir.joinpath("csv")
     if not csv_dir.exists():
@@ -31,13 +45,63 @@ def csv_to_json_instance(data_dir: Path, json_dir: Path | None = None):
         df = pd.read_csv(csv_path)
         json_phase_dir = json_dir.joinpath(phase.ja)
         json_phase_dir.mkdir(exist_ok=True)
-        for idx, row in df.iterrows():
-            # TODO: 現状00, 01, 02, ...となっているが, 桁数を自動的に決定するようにする
-            json_path = json_phase_dir.joinpath(f"{phase.ja}_{idx:02}.json")
-            json_str: str = row.to_json(force_ascii=False, orient="index")
-            json_obj: dict[str, Any] = {"フェーズ": phase.ja}
-            json_obj.update(json.loads(json_str))
-            save_json_obj(json_obj, json_path)
+        json_objs = dataframe_to_json_instances(df, phase)
+        save_json_instances(json_objs, json_phase_dir, phase)
+
+
+def save_json_instances(
+    json_objs: list[dict[str, Any]], json_phase_dir: Path, phase: DevPhase
+) -> None:
+    json_paths: set[Path] = set()
+    for idx, json_obj in enumerate(json_objs):
+        # TODO: 現状00, 01, 02, ...となっているが, 桁数を自動的に決定するようにする
+        json_path = json_phase_dir.joinpath(f"{phase.ja}_{idx:02}.json")
+        save_json_obj(json_obj, json_path)
+        json_paths.add(json_path)
+    # NOTE: 行が減った場合に残る古いJSONインスタンスを削除
+    for json_path in json_phase_dir.glob(f"{phase.ja}_*.json"):
+        if json_path not in json_paths:
+            json_path.unlink()
+            print(f"Deleted {json_path.resolve()}")
+
+
+def dataframe_to_json_schema(df: pd.DataFrame, phase: DevPhase) -> dict[str, Any]:
+    """Creates the JSON schema of the phase from the columns of a DataFrame."""
+    json_schema_obj: dict[str, Any] = {
+        "フェーズ": {"type": "string", "enum": [phase.ja]},
+    }
+    required_columns: list[str] = ["フェーズ", "システム"]
+    for column_name in df.columns:
+        if column_name == "システム":
+            json_schema_obj[column_name] = {
+                "type": "string",
+            }
+
+        elif column_name == "算出方法":
+            json_schema_obj[column_name] = {
+                "type": "string",
+                "enum": ["合計値", "平均値", "中央値"],
+            }
+            required_columns.append(column_name)
+        elif column_name == "分類":
+            json_schema_obj[column_name] = {
+                "type": "string",
+                "enum": [
+                    "全体",
+                    "新規",
+                    "修正",
+                ],
+            }
+            required_columns.append(column_name)
+        else:
+            json_schema_obj[column_name] = {
+                "type": ["number", "null"],
+            }
+    return {
+        "type": "object",
+        "properties": json_schema_obj,
+        "required": required_columns,
+    }
 
 
 def csv_to_json_schema(data_dir: Path, json_dir: Path | None = None):
@@ -53,42 +117,7 @@ def csv_to_json_schema(data_dir: Path, json_dir: Path | None = None):
         json_phase_dir = json_dir.joinpath(phase.ja)
         json_phase_dir.mkdir(exist_ok=True)
         json_schema_path = json_phase_dir.joinpath(f"{phase.ja}.schema.json")
-        json_schema_obj: dict[str, Any] = {
-            "フェーズ": {"type": "string", "enum": [phase.ja]},
-        }
-        required_columns: list[str] = ["フェーズ", "システム"]
-        for column_name in df.columns:
-            if column_name == "システム":
-                json_schema_obj[column_name] = {
-                    "type": "string",
-                }
-
-            elif column_name == "算出方法":
-                json_schema_obj[column_name] = {
-                    "type": "string",
-                    "enum": ["合計値", "平均値", "中央値"],
-                }
-                required_columns.append(column_name)
-            elif column_name == "分類":
-                json_schema_obj[column_name] = {
-                    "type": "string",
-                    "enum": [
-                        "全体",
-                        "新規",
-                        "修正",
-                    ],
-                }
-                required_columns.append(column_name)
-            else:
-                json_schema_obj[column_name] = {
-                    "type": ["number", "null"],
-                }
-        json_schema_obj = {
-            "type": "object",
-            "properties": json_schema_obj,
-            "required": required_columns,
-        }
-        save_json_obj(json_schema_obj, json_schema_path)
+        save_json_obj(dataframe_to_json_schema(df, phase), json_schema_path)
 
 
 def main():
@@ -1,5 +1,6 @@
 import os
 import unicodedata
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import pandas as pd
@@ -29,10 +30,31 @@ def get_rag_tab_path() -> Path:
     return rag_tab_path
 
 
+def get_rag_tab_workers() -> int | None:
+    """Returns the number of processes parsing the sheets of the Excel file.
+
+    Set by the environment variable `RAG_TAB_WORKERS`.
+    `None` (unset) means that the workbook is parsed once in this process.
+    """
+    _rag_tab_workers: str | None = os.getenv("RAG_TAB_WORKERS")
+    if _rag_tab_workers is None:
+        return None
+    try:
+        return int(_rag_tab_workers)
+    except ValueError:
+        raise ValueError("環境変数RAG_TAB_WORKERSには整数を設定してください。")
+
+
 def excel_to_csv(
     excel_path: Path, phase: DevPhase, csv_path: Path | None = None
 ) -> None:
     df = read_excel(excel_path, phase)
+    save_csv(excel_path, phase, df, csv_path=csv_path)
+
+
+def save_csv(
+    excel_path: Path, phase: DevPhase, df: pd.DataFrame, csv_path: Path | None = None
+) -> None:
     if csv_path is None:
         csv_dir = excel_path.parent.joinpath("csv")
         csv_dir.mkdir(exist_ok=True)
@@ -40,17 +62,49 @@ def excel_to_csv(
     to_csv(df, csv_path)
 
 
+# NOTE: 各シートの読み込みオプション
+READ_EXCEL_KWARGS = {
+    "header": [0, 1, 2],  # NOTE: ヘッダ行をあらかじめ指定
+    "skiprows": 1,  # NOTE: 1行目をスキップ
+    "engine": "openpyxl",  # openpyxlへの依存
+}
+
+
 def read_excel(data_path: Path, phase: DevPhase) -> pd.DataFrame:
     """Read Excel file and return DataFrame."""
     df = pd.read_excel(
         data_path,
         sheet_name=phase.ja,  # NOTE: シート名をあらかじめ指定
-        header=[0, 1, 2],  # NOTE: ヘッダ行をあらかじめ指定
-        skiprows=1,  # NOTE: 1行目をスキップ
-        engine="openpyxl",  # openpyxlへの依存
-    ).iloc[
-        :, 1:
-    ]  # NOTE: 1列目を削除
+        **READ_EXCEL_KWARGS,
+    )
+    return format_sheet(df)
+
+
+def read_excel_sheets(
+    data_path: Path, max_workers: int | None = None
+) -> dict[DevPhase, pd.DataFrame]:
+    """Read all the sheets of Excel file and return DataFrames.
+
+    The workbook is opened and parsed once for all the sheets.
+    If `max_workers` is greater than 1, the sheets are instead parsed
+    in parallel by a pool of `max_workers` processes.
+    """
+    if max_workers is not None and max_workers > 1:
+        phases = list(DevPhase)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            dfs = executor.map(read_excel, [data_path] * len(phases), phases)
+            return dict(zip(phases, dfs))
+    dfs = pd.read_excel(
+        data_path,
+        sheet_name=[phase.ja for phase in DevPhase],  # NOTE: シート名をあらかじめ指定
+        **READ_EXCEL_KWARGS,
+    )
+    return {phase: format_sheet(dfs[phase.ja]) for phase in DevPhase}
+
+
+def format_sheet(df: pd.DataFrame) -> pd.DataFrame:
+    """Format DataFrame read from a sheet of Excel file."""
+    df = df.iloc[:, 1:]  # NOTE: 1列目を削除
     flatten_header(df)
     return df
 
@@ -110,8 +164,9 @@ def to_csv(df: pd.DataFrame, csv_path: Path) -> None:
 
 def main() -> None:
     rag_tab_path: Path = get_rag_tab_path()
-    for phase in DevPhase:
-        excel_to_csv(rag_tab_path, phase)
+    dfs = read_excel_sheets(rag_tab_path, max_workers=get_rag_tab_workers())
+    for phase, df in dfs.items():
+        save_csv(rag_tab_path, phase, df)
 
 
 if __name__ == "__main__":
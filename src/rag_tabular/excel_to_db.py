@@ -0,0 +1,111 @@
+"""Converts the Excel file directly to a SQLite database.
+
+Each sheet is read into a DataFrame once, converted to validated rows in memory
+and inserted into the database, without the intermediate CSV file and the
+per-row JSON files of `excel_to_csv`, `csv_to_json` and `json_to_db`.
+The resulting database has the same schema, plus the content hashes of the
+sheets and rows, so that a re-run only writes the rows that changed.
+
+The JSON schemata are always saved because `query_sql_db` reads them.
+The CSV files and the JSON instances are saved only on request, e.g. for auditing.
+"""
+
+import argparse
+from pathlib import Path
+from typing import Any
+
+from jsonschema.validators import validator_for
+
+from rag_tabular.csv_to_json import (
+    dataframe_to_json_instances,
+    dataframe_to_json_schema,
+    save_json_instances,
+    save_json_obj,
+)
+from rag_tabular.excel_to_csv import (
+    get_rag_tab_path,
+    get_rag_tab_workers,
+    read_excel_sheets,
+    save_csv,
+)
+from rag_tabular.json_to_db import sync_db
+from util.catvar import DevPhase
+
+
+def excel_to_db(
+    excel_path: Path,
+    db_path: Path | None = None,
+    json_dir: Path | None = None,
+    emit_csv: bool = False,
+    emit_json: bool = False,
+    full_rebuild: bool = False,
+    max_workers: int | None = None,
+) -> None:
+    """Creates or updates the database from the Excel file in one pass.
+
+    `emit_csv` and `emit_json` additionally save the CSV files and the JSON
+    instances that the step-by-step pipeline would have created.
+    Unless `full_rebuild` is set, only the rows that changed since the last run
+    are written (see `sync_db`).
+    `max_workers` is passed to `read_excel_sheets`.
+    """
+    data_dir: Path = excel_path.parent
+    if db_path is None:
+        # If `excel_path` is `foo/bar.xlsx`, then `db_path` is `foo/bar.sqlite3`
+        db_path = data_dir.joinpath(excel_path.stem + ".sqlite3")
+    if json_dir is None:
+        json_dir = data_dir.joinpath("json")
+    json_dir.mkdir(exist_ok=True)
+
+    json_schema_objs: dict[DevPhase, dict[str, Any]] = {}
+    rows: dict[DevPhase, list[dict[str, Any]]] = {}
+    dfs = read_excel_sheets(excel_path, max_workers=max_workers)
+    for phase, df in dfs.items():
+        if emit_csv:
+            save_csv(excel_path, phase, df)
+        json_schema_obj = dataframe_to_json_schema(df, phase)
+        json_objs = dataframe_to_json_instances(df, phase)
+        # NOTE: バリデータはフェーズごとに1回だけ作る
+        validator = validator_for(json_schema_obj)(json_schema_obj)
+        for json_obj in json_objs:
+            validator.validate(json_obj)
+        json_phase_dir = json_dir.joinpath(phase.ja)
+        json_phase_dir.mkdir(exist_ok=True)
+        save_json_obj(
+            json_schema_obj, json_phase_dir.joinpath(f"{phase.ja}.schema.json")
+        )
+        if emit_json:
+            save_json_instances(json_objs, json_phase_dir, phase)
+        json_schema_objs[phase] = json_schema_obj
+        rows[phase] = [
+            {key: value for key, value in json_obj.items() if key != "フェーズ"}
+            for json_obj in json_objs
+        ]
+
+    sync_db(db_path, json_schema_objs, rows, full_rebuild=full_rebuild)
+    print(f"Updated {db_path.resolve()}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--emit-csv", action="store_true", help="CSVファイルも出力する")
+    parser.add_argument(
+        "--emit-json", action="store_true", help="JSONインスタンスも出力する"
+    )
+    parser.add_argument(
+        "--full-rebuild",
+        action="store_true",
+        help="差分更新せずにデータベースを作り直す",
+    )
+    args = parser.parse_args(argv)
+    excel_to_db(
+        get_rag_tab_path(),
+        emit_csv=args.emit_csv,
+        emit_json=args.emit_json,
+        full_rebuild=args.full_rebuild,
+        max_workers=get_rag_tab_workers(),
+    )
+
+
+if __name__ == "__main__":
+    main()
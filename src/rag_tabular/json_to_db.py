@@ -4,32 +4,88 @@ Relies on SQL Expression Language of SQLAlchemy.
 Uses no ORM (Object-Relational Mapping) or raw SQL.
 """
 
+import hashlib
 import json
+import threading
+import time
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable
 
 import pandas as pd
-from jsonschema import validate
-from sqlalchemy import Column, Float, ForeignKey, MetaData, String, Table
+from jsonschema.exceptions import best_match
+from jsonschema.protocols import Validator
+from jsonschema.validators import validator_for
+from sqlalchemy import (
+    Column,
+    Float,
+    ForeignKey,
+    Index,
+    MetaData,
+    Select,
+    String,
+    Table,
+    bindparam,
+)
 from sqlalchemy import create_engine as _create_engine
-from sqlalchemy import select
+from sqlalchemy import delete, select, union
 from sqlalchemy.dialects.sqlite import insert
-from sqlalchemy.engine import Engine
+from sqlalchemy.engine import Connection, Engine
 
 from rag_tabular.excel_to_csv import get_rag_tab_path
+from rag_tabular.summary import build_summaries, define_summary_tables, lookup_summary
 from util.catvar import DevPhase
 
+# NOTE: JSONスキーマのパス -> (JSONスキーマの更新時刻, バリデータ)
+_validators: dict[Path, tuple[int, Validator]] = {}
+_validators_lock = threading.Lock()
+
+
+def get_validator(json_dir: Path, phase_ja: str) -> Validator:
+    """Returns the validator of the JSON schema of the phase.
+
+    The validator is created once and reused until the schema file is modified.
+    """
+    json_schema_path = json_dir.joinpath(f"{phase_ja}/{phase_ja}.schema.json")
+    json_schema_path = json_schema_path.resolve()
+    mtime = json_schema_path.stat().st_mtime_ns
+    with _validators_lock:
+        if json_schema_path in _validators:
+            loaded_mtime, validator = _validators[json_schema_path]
+            if loaded_mtime == mtime:
+                return validator
+        with open(json_schema_path, "r", encoding="utf-8") as f:
+            json_schema_obj: dict[str, Any] = json.load(f)
+        cls = validator_for(json_schema_obj)
+        cls.check_schema(json_schema_obj)
+        validator = cls(json_schema_obj)
+        _validators[json_schema_path] = (mtime, validator)
+        return validator
+
+
+def validate_json_instances(
+    json_objs: Iterable[dict[str, Any]], json_dir: Path
+) -> None:
+    """Validates JSON instances against the JSON schemata of their phases.
+
+    Raises: `jsonschema.ValidationError` for the first invalid instance,
+    as `jsonschema.validate` does.
+    """
+    validators: dict[str, Validator] = {}
+    for json_obj in json_objs:
+        phase_ja = json_obj["フェーズ"]
+        if phase_ja not in validators:
+            validators[phase_ja] = get_validator(json_dir, phase_ja)
+        error = best_match(validators[phase_ja].iter_errors(json_obj))
+        if error is not None:
+            raise error
+
 
 def json_instance_to_pandas_series(
     json_obj: dict[str, Any], json_dir: Path, remove_phase_key: bool = True
 ) -> pd.Series:
     """Converts a JSON instance to a pandas Series."""
     # Validate `json_obj` against the schema
-    phase_ja = json_obj["フェーズ"]
-    json_schema_path = json_dir.joinpath(f"{phase_ja}/{phase_ja}.schema.json")
-    with open(json_schema_path, "r", encoding="utf-8") as f:
-        json_schema_obj: dict[str, Any] = json.load(f)
-    validate(instance=json_obj, schema=json_schema_obj)
+    validate_json_instances([json_obj], json_dir)
     # Remove keys that have null (None) values
     json_obj = {key: value for key, value in json_obj.items() if value is not None}
     if remove_phase_key:
@@ -37,14 +93,92 @@ def json_instance_to_pandas_series(
     return pd.Series(json_obj)
 
 
+# NOTE: query_sql_dbの検索条件 (算出方法, 分類) を先頭にした、各フェーズのテーブルのインデックス
+QUERY_INDEX_COLUMNS = ("算出方法", "分類", "システム")
+
+
+# NOTE: 一括挿入の間だけ適用するSQLiteのプラグマ（ビルド中に異常終了した場合はDBを作り直す）
+BULK_LOAD_PRAGMAS = {"journal_mode": "MEMORY", "synchronous": "OFF"}
+
+
+def get_db_path(excel_path: Path) -> Path:
+    """Returns the path to the database built from the Excel file."""
+    # If `excel_path` is `foo/bar.xlsx`, then `db_path` is `foo/bar.sqlite3`
+    return excel_path.parent.joinpath(excel_path.stem + ".sqlite3")
+
+
 def create_engine(db_path: Path) -> Engine:
     return _create_engine(f"sqlite:///{db_path}?charset=utf8", echo=False)
 
 
+def load_json_schemata(json_dir: Path) -> dict[DevPhase, dict[str, Any]]:
+    """Loads the JSON schema of each phase."""
+    json_schema_objs: dict[DevPhase, dict[str, Any]] = {}
+    for phase in DevPhase:
+        json_phase_dir = json_dir.joinpath(phase.ja)
+        json_schema_path = json_phase_dir.joinpath(f"{phase.ja}.schema.json")
+        with open(json_schema_path, "r", encoding="utf-8") as f:
+            json_schema_objs[phase] = json.load(f)
+    return json_schema_objs
+
+
+def define_tables(json_dir: Path) -> MetaData:
+    """Defines the tables of the database from JSON schemata."""
+    return define_tables_from_schemata(load_json_schemata(json_dir))
+
+
+def define_tables_from_schemata(
+    json_schema_objs: dict[DevPhase, dict[str, Any]]
+) -> MetaData:
+    """Defines the tables of the database from loaded JSON schemata."""
+    metadata_obj = MetaData()
+    Table(
+        "systems",
+        metadata_obj,
+        Column("システム", String, primary_key=True, nullable=False),
+        Column("説明", String, nullable=True),
+    )
+    for phase, json_schema_obj in json_schema_objs.items():
+
+        def columns():
+            for key, value in json_schema_obj["properties"].items():
+                if key == "フェーズ":
+                    continue
+                if key == "システム":
+                    yield Column(
+                        key,
+                        String,
+                        ForeignKey("systems.システム"),
+                        primary_key=True,
+                        nullable=False,
+                    )
+                elif value["type"] == "string":
+                    yield Column(key, String, primary_key=True, nullable=False)
+                elif value["type"] == ["number", "null"]:
+                    yield Column(key, Float(precision=10), nullable=True)
+
+        table = Table(
+            f"{phase.name}",  # テーブル名は日本語にできない
+            metadata_obj,
+            *columns(),  # フィールド名は日本語のまま
+        )
+        # NOTE: 主キーの先頭はシステムなので、算出方法と分類による検索には使えない
+        Index(
+            f"ix_{phase.name}_query",
+            *[
+                table.c[key]
+                for key in QUERY_INDEX_COLUMNS
+                if key in table.c  # NOTE: 分類はフェーズによってはない
+            ],
+        )
+    return metadata_obj
+
+
 def define_db(excel_path: Path, db_path: Path | None = None) -> None:
     """Creates a database schema (metadata) from JSON schemata.
 
-    Uses DDL (Data Definition Language) `CREATE TABLE` under the hood.
+    Uses DDL (Data Definition Language) `CREATE TABLE` and `CREATE INDEX`
+    under the hood.
     """
     data_dir: Path = excel_path.parent
     if db_path is None:
@@ -55,45 +189,84 @@ def define_db(excel_path: Path, db_path: Path | None = None) -> None:
         print(f"Deleted {db_path.resolve()}")
 
     engine = create_engine(db_path)
-    metadata_obj = MetaData()
-    Table(
-        "systems",
-        metadata_obj,
-        Column("システム", String, primary_key=True, nullable=False),
-        Column("説明", String, nullable=True),
-    )
-    for phase in DevPhase:
-        json_phase_dir = data_dir.joinpath(f"json/{phase.ja}")
-        json_schema_path = json_phase_dir.joinpath(f"{phase.ja}.schema.json")
-        with open(json_schema_path, "r", encoding="utf-8") as f:
-            json_schema_obj: dict[str, Any] = json.load(f)
-
-            def columns():
-                for key, value in json_schema_obj["properties"].items():
-                    if key == "フェーズ":
-                        continue
-                    if key == "システム":
-                        yield Column(
-                            key,
-                            String,
-                            ForeignKey("systems.システム"),
-                            primary_key=True,
-                            nullable=False,
-                        )
-                    elif value["type"] == "string":
-                        yield Column(key, String, primary_key=True, nullable=False)
-                    elif value["type"] == ["number", "null"]:
-                        yield Column(key, Float(precision=10), nullable=True)
-
-            Table(
-                f"{phase.name}",  # テーブル名は日本語にできない
-                metadata_obj,
-                *columns(),  # フィールド名は日本語のまま
-            )
+    metadata_obj = define_tables(data_dir.joinpath("json"))
     metadata_obj.create_all(engine)
+    define_summary_tables().create_all(engine)
     print(f"Created {db_path.resolve()}")
 
 
+def bulk_insert(
+    db_path: Path,
+    metadata_obj: MetaData,
+    rows: dict[DevPhase, list[dict[str, Any]]],
+) -> int:
+    """Inserts rows into the phase-specific tables in bulk.
+
+    The rows are inserted with one multi-row `executemany` per table, with
+    `BULK_LOAD_PRAGMAS` applied and the secondary indexes created only after
+    the rows are in place. The "systems" table is filled along the way.
+    Returns the number of rows inserted into the phase-specific tables.
+    """
+    engine = create_engine(db_path)
+    systems_table = metadata_obj.tables["systems"]
+    num_rows = 0
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        # NOTE: プラグマはSQLAlchemyの式言語では表せない
+        for key, value in BULK_LOAD_PRAGMAS.items():
+            conn.exec_driver_sql(f"PRAGMA {key} = {value}")
+        conn.commit()
+        with conn.begin():
+            for phase, phase_rows in rows.items():
+                if not phase_rows:
+                    continue
+                table = metadata_obj.tables[phase.name]
+                for index in table.indexes:
+                    index.drop(conn, checkfirst=True)
+                # upsert (insert or update) into the "systems" table
+                stmt = insert(systems_table).on_conflict_do_nothing(
+                    index_elements=["システム"]
+                )
+                conn.execute(
+                    stmt, [{"システム": row["システム"]} for row in phase_rows]
+                )
+                # insert into the phase-specific table
+                # NOTE: executemanyでは全ての行が同じキーを持つ必要がある
+                conn.execute(
+                    insert(table),
+                    [
+                        {column.name: row.get(column.name) for column in table.c}
+                        for row in phase_rows
+                    ],
+                )
+                for index in table.indexes:
+                    index.create(conn)
+                num_rows += len(phase_rows)
+    engine.dispose()
+    elapsed = time.perf_counter() - start
+    print(
+        f"Inserted {num_rows} rows in {elapsed:.3f}s "
+        f"({num_rows / elapsed if elapsed else 0.0:.0f} rows/sec)"
+    )
+    return num_rows
+
+
+def load_json_instances(json_dir: Path) -> dict[DevPhase, list[dict[str, Any]]]:
+    """Loads the JSON instances of each phase without the "フェーズ" key."""
+    rows: dict[DevPhase, list[dict[str, Any]]] = {}
+    for phase in DevPhase:
+        rows[phase] = []
+        json_phase_dir = json_dir.joinpath(phase.ja)
+        for json_path in sorted(json_phase_dir.iterdir()):
+            if json_path.suffixes != [".json"]:
+                continue
+            with open(json_path, "r", encoding="utf-8") as f:
+                json_obj: dict[str, Any] = json.load(f)
+            json_obj.pop("フェーズ")
+            rows[phase].append(json_obj)
+    return rows
+
+
 def manipulate_db(excel_path: Path, db_path: Path | None = None) -> None:
     """Inserts JSON instances into the database.
 
@@ -103,28 +276,356 @@ def manipulate_db(excel_path: Path, db_path: Path | None = None) -> None:
     if db_path is None:
         # If `excel_path` is `foo/bar.xlsx`, then `db_path` is `foo/bar.sqlite3`
         db_path = data_dir.joinpath(excel_path.stem + ".sqlite3")
+    json_dir = data_dir.joinpath("json")
+    metadata_obj = define_tables(json_dir)
+    bulk_insert(db_path, metadata_obj, load_json_instances(json_dir))
     engine = create_engine(db_path)
+    with engine.begin() as conn:
+        build_summaries(conn, metadata_obj, define_summary_tables(), list(DevPhase))
+    engine.dispose()
+    print(f"Updated {db_path.resolve()}")
+
+
+def content_hash(obj: Any) -> str:
+    """Returns the SHA-256 hash of a JSON-serializable object."""
+    json_str = json.dumps(obj, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(json_str.encode("utf-8")).hexdigest()
+
+
+def define_hash_tables() -> MetaData:
+    """Defines the tables recording the content hashes of the sheets and rows.
+
+    The hashes are kept apart from the tables of `define_tables`,
+    which represent the Excel file itself.
+    """
     metadata_obj = MetaData()
-    metadata_obj.reflect(bind=engine)
+    Table(
+        "sheet_hashes",
+        metadata_obj,
+        Column("phase", String, primary_key=True, nullable=False),
+        Column("schema_hash", String, nullable=False),
+        Column("sheet_hash", String, nullable=False),
+    )
+    Table(
+        "row_hashes",
+        metadata_obj,
+        Column("phase", String, primary_key=True, nullable=False),
+        # NOTE: 主キーの値のJSON配列
+        Column("row_key", String, primary_key=True, nullable=False),
+        Column("row_hash", String, nullable=False),
+    )
+    return metadata_obj
+
+
+def row_key(table: Table, row: dict[str, Any]) -> str:
+    """Returns the primary key of the row as a JSON array."""
+    return json.dumps([row[column.name] for column in table.primary_key])
+
+
+def read_sheet_hashes(db_path: Path) -> dict[str, tuple[str, str]] | None:
+    """Returns the recorded schema and sheet hashes of each phase.
+
+    Returns `None` if the database or its hashes do not exist.
+    """
+    if not db_path.exists():
+        return None
+    engine = create_engine(db_path)
+    sheet_hashes = define_hash_tables().tables["sheet_hashes"]
+    try:
+        with engine.connect() as conn:
+            if not engine.dialect.has_table(conn, sheet_hashes.name):
+                return None
+            result = conn.execute(select(sheet_hashes))
+            return {row.phase: (row.schema_hash, row.sheet_hash) for row in result}
+    finally:
+        engine.dispose()
+
+
+def upsert_hashes(
+    conn: Connection,
+    hash_metadata_obj: MetaData,
+    phase: DevPhase,
+    schema_hash: str,
+    sheet_hash: str,
+    row_hashes: dict[str, str],
+) -> None:
+    """Records the hashes of a sheet and of its (added or modified) rows."""
+    sheet_hashes_table = hash_metadata_obj.tables["sheet_hashes"]
+    row_hashes_table = hash_metadata_obj.tables["row_hashes"]
+    stmt = insert(sheet_hashes_table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["phase"],
+        set_={
+            "schema_hash": stmt.excluded.schema_hash,
+            "sheet_hash": stmt.excluded.sheet_hash,
+        },
+    )
+    conn.execute(
+        stmt,
+        {"phase": phase.name, "schema_hash": schema_hash, "sheet_hash": sheet_hash},
+    )
+    if not row_hashes:
+        return
+    stmt = insert(row_hashes_table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["phase", "row_key"],
+        set_={"row_hash": stmt.excluded.row_hash},
+    )
+    conn.execute(
+        stmt,
+        [
+            {"phase": phase.name, "row_key": key, "row_hash": row_hash}
+            for key, row_hash in row_hashes.items()
+        ],
+    )
+
+
+def sync_db(
+    db_path: Path,
+    json_schema_objs: dict[DevPhase, dict[str, Any]],
+    rows: dict[DevPhase, list[dict[str, Any]]],
+    full_rebuild: bool = False,
+) -> None:
+    """Brings the database in line with the rows, rebuilding it only if needed.
+
+    The database is rebuilt from scratch if it does not exist, has no recorded
+    hashes, or any JSON schema has changed. Otherwise, the sheets whose hash
+    has not changed are skipped, and in the other sheets only the added,
+    modified and deleted rows are written, in place and in one transaction.
+    """
+    metadata_obj = define_tables_from_schemata(json_schema_objs)
+    hash_metadata_obj = define_hash_tables()
+    summary_metadata_obj = define_summary_tables()
+    schema_hashes = {phase: content_hash(json_schema_objs[phase]) for phase in DevPhase}
+    sheet_hashes = {phase: content_hash(rows[phase]) for phase in DevPhase}
+    stored_sheet_hashes = None if full_rebuild else read_sheet_hashes(db_path)
+
+    if stored_sheet_hashes is None or any(
+        stored_sheet_hashes.get(phase.name, (None, None))[0] != schema_hashes[phase]
+        for phase in DevPhase
+    ):
+        if db_path.exists():
+            db_path.unlink()
+            print(f"Deleted {db_path.resolve()}")
+        engine = create_engine(db_path)
+        metadata_obj.create_all(engine)
+        hash_metadata_obj.create_all(engine)
+        summary_metadata_obj.create_all(engine)
+        print(f"Created {db_path.resolve()}")
+        bulk_insert(db_path, metadata_obj, rows)
+        with engine.begin() as conn:
+            build_summaries(conn, metadata_obj, summary_metadata_obj, list(DevPhase))
+            for phase in DevPhase:
+                table = metadata_obj.tables[phase.name]
+                upsert_hashes(
+                    conn,
+                    hash_metadata_obj,
+                    phase,
+                    schema_hashes[phase],
+                    sheet_hashes[phase],
+                    {row_key(table, row): content_hash(row) for row in rows[phase]},
+                )
+        engine.dispose()
+        return
+
+    engine = create_engine(db_path)
+    with engine.connect() as conn:
+        has_summaries = engine.dialect.has_table(conn, "metric_summaries")
+    if not has_summaries:
+        # NOTE: 集計テーブルがない古いデータベースには、全フェーズの集計を追加
+        summary_metadata_obj.create_all(engine)
+    systems_table = metadata_obj.tables["systems"]
+    row_hashes_table = hash_metadata_obj.tables["row_hashes"]
+    num_upserted = num_deleted = 0
+    changed_phases: list[DevPhase] = [] if has_summaries else list(DevPhase)
+    start = time.perf_counter()
     with engine.begin() as conn:
         for phase in DevPhase:
-            json_phase_dir = data_dir.joinpath(f"json/{phase.ja}")
-            for json_path in json_phase_dir.iterdir():
-                if json_path.suffixes != [".json"]:
-                    continue
-                with open(json_path, "r", encoding="utf-8") as f:
-                    json_obj: dict[str, Any] = json.load(f)
-                json_obj.pop("フェーズ")
+            if stored_sheet_hashes.get(phase.name) == (
+                schema_hashes[phase],
+                sheet_hashes[phase],
+            ):
+                continue
+            table = metadata_obj.tables[phase.name]
+            select_stmt = select(
+                row_hashes_table.c.row_key, row_hashes_table.c.row_hash
+            ).where(row_hashes_table.c.phase == phase.name)
+            stored_row_hashes: dict[str, str] = {
+                key: row_hash for key, row_hash in conn.execute(select_stmt).all()
+            }
+            keyed_rows = {row_key(table, row): row for row in rows[phase]}
+            row_hashes = {key: content_hash(row) for key, row in keyed_rows.items()}
+            deleted_keys = stored_row_hashes.keys() - row_hashes.keys()
+            upserted_row_hashes = {
+                key: row_hash
+                for key, row_hash in row_hashes.items()
+                if stored_row_hashes.get(key) != row_hash
+            }
+            if deleted_keys:
+                # delete from the phase-specific table
+                delete_stmt = delete(table).where(
+                    *[
+                        column == bindparam(f"pk_{i}")
+                        for i, column in enumerate(table.primary_key)
+                    ]
+                )
+                conn.execute(
+                    delete_stmt,
+                    [
+                        {f"pk_{i}": value for i, value in enumerate(json.loads(key))}
+                        for key in deleted_keys
+                    ],
+                )
+                delete_hashes_stmt = delete(row_hashes_table).where(
+                    row_hashes_table.c.phase == phase.name,
+                    row_hashes_table.c.row_key == bindparam("key"),
+                )
+                conn.execute(delete_hashes_stmt, [{"key": key} for key in deleted_keys])
+            if upserted_row_hashes:
+                upserted_rows = [keyed_rows[key] for key in upserted_row_hashes]
                 # upsert (insert or update) into the "systems" table
-                stmt = insert(metadata_obj.tables["systems"]).values(
-                    システム=json_obj["システム"]
+                insert_systems_stmt = insert(systems_table).on_conflict_do_nothing(
+                    index_elements=["システム"]
                 )
-                stmt = stmt.on_conflict_do_nothing(index_elements=["システム"])
-                conn.execute(stmt)
-                # insert into the phase-specific table
-                stmt = insert(metadata_obj.tables[phase.name]).values(**json_obj)
-                conn.execute(stmt)
-    print(f"Updated {db_path.resolve()}")
+                conn.execute(
+                    insert_systems_stmt,
+                    [{"システム": row["システム"]} for row in upserted_rows],
+                )
+                # upsert into the phase-specific table
+                insert_stmt = insert(table)
+                upsert_stmt = insert_stmt.on_conflict_do_update(
+                    index_elements=list(table.primary_key),
+                    set_={
+                        column.name: insert_stmt.excluded[column.name]
+                        for column in table.c
+                        if not column.primary_key
+                    },
+                )
+                conn.execute(
+                    upsert_stmt,
+                    [
+                        {column.name: row.get(column.name) for column in table.c}
+                        for row in upserted_rows
+                    ],
+                )
+            upsert_hashes(
+                conn,
+                hash_metadata_obj,
+                phase,
+                schema_hashes[phase],
+                sheet_hashes[phase],
+                upserted_row_hashes,
+            )
+            num_upserted += len(upserted_row_hashes)
+            num_deleted += len(deleted_keys)
+            if (upserted_row_hashes or deleted_keys) and phase not in changed_phases:
+                changed_phases.append(phase)
+        # NOTE: 集計は行が変わったフェーズのみ作り直す
+        build_summaries(conn, metadata_obj, summary_metadata_obj, changed_phases)
+        if num_deleted:
+            # NOTE: どのフェーズにも行が残っていないシステムを削除
+            remaining_systems_stmt = union(
+                *[
+                    select(metadata_obj.tables[phase.name].c["システム"])
+                    for phase in DevPhase
+                ]
+            )
+            conn.execute(
+                delete(systems_table).where(
+                    systems_table.c["システム"].not_in(remaining_systems_stmt)
+                )
+            )
+    engine.dispose()
+    elapsed = time.perf_counter() - start
+    print(
+        f"Upserted {num_upserted} rows and deleted {num_deleted} rows "
+        f"in {elapsed:.3f}s"
+    )
+
+
+class TabularStore:
+    """Read access to the SQLite database through a long-lived engine.
+
+    The tables are defined once from the JSON schemata instead of being
+    reflected from the database, and a `SELECT` statement is built once per
+    query shape, i.e., per phase, selected columns and filters.
+    """
+
+    def __init__(self, db_path: Path, json_dir: Path):
+        self.db_path = db_path
+        self.engine = create_engine(db_path)
+        self.metadata_obj = define_tables(json_dir)
+        self.summary_metadata_obj = define_summary_tables()
+        self._statements: dict[tuple[DevPhase, tuple[str, ...], bool], Select] = {}
+        self._lock = threading.Lock()
+
+    def statement(
+        self, phase: DevPhase, columns: tuple[str, ...], by_classification: bool
+    ) -> Select:
+        """Returns the statement for the query shape, building it if necessary."""
+        key = (phase, columns, by_classification)
+        with self._lock:
+            if key not in self._statements:
+                table = self.metadata_obj.tables[phase.name]
+                stmt = select(*[table.c[column] for column in columns]).where(
+                    table.c["算出方法"] == bindparam("calc_method")
+                )
+                if by_classification:
+                    stmt = stmt.where(table.c["分類"] == bindparam("classification"))
+                self._statements[key] = stmt
+            return self._statements[key]
+
+    def query(self, json_obj: dict[str, Any]) -> pd.DataFrame:
+        """Selects the rows sharing the 算出方法 (and 分類) of `json_obj`."""
+        phase = DevPhase.from_ja(json_obj["フェーズ"])
+        columns = tuple(
+            key
+            for key, value in json_obj.items()
+            if value is not None and key != "フェーズ"
+        )
+        stmt = self.statement(phase, columns, "分類" in json_obj)
+        params = {"calc_method": json_obj["算出方法"]}
+        if "分類" in json_obj:
+            params["classification"] = json_obj["分類"]
+        with self.engine.connect() as conn:
+            result = conn.execute(stmt, params)
+            return pd.DataFrame(result, columns=result.keys())
+
+    def summary(self, json_obj: dict[str, Any]) -> pd.DataFrame:
+        """Looks up where each metric of `json_obj` sits among all systems.
+
+        Returns an empty DataFrame if the database has no summaries.
+        """
+        with self.engine.connect() as conn:
+            if not self.engine.dialect.has_table(conn, "metric_summaries"):
+                return pd.DataFrame()
+            return lookup_summary(conn, self.summary_metadata_obj, json_obj)
+
+    def dispose(self) -> None:
+        self.engine.dispose()
+
+
+# NOTE: DBファイルのパス -> (DBファイルのinode番号, TabularStore)
+_stores: dict[Path, tuple[int, TabularStore]] = {}
+_stores_lock = threading.Lock()
+
+
+def get_tabular_store(db_path: Path, json_dir: Path) -> TabularStore:
+    """Returns the store shared within the process for `db_path`.
+
+    A new store is opened if the database file has been recreated.
+    """
+    db_path = db_path.resolve()
+    inode = db_path.stat().st_ino
+    with _stores_lock:
+        if db_path in _stores:
+            loaded_inode, store = _stores[db_path]
+            if loaded_inode == inode:
+                return store
+            store.dispose()
+        store = TabularStore(db_path, json_dir)
+        _stores[db_path] = (inode, store)
+        return store
 
 
 def query_sql_db(
@@ -136,34 +637,32 @@ def query_sql_db(
 
     Uses DQL (Data Query Language) `SELECT FROM` under the hood.
     """
-    phase = DevPhase.from_ja(json_obj["フェーズ"])
     excel_path: Path = get_rag_tab_path()
     data_dir: Path = excel_path.parent
+    json_dir = data_dir.joinpath("json")
     series = json_instance_to_pandas_series(
-        json_obj, data_dir.joinpath("json"), remove_phase_key=remove_phase_key
+        json_obj, json_dir, remove_phase_key=remove_phase_key
     )
     if db_path is None:
-        # If `excel_path` is `foo/bar.xlsx`, then `db_path` is `foo/bar.sqlite3`
-        db_path = data_dir.joinpath(excel_path.stem + ".sqlite3")
-    engine = create_engine(db_path)
-    metadata_obj = MetaData()
-    metadata_obj.reflect(bind=engine)
-    table = metadata_obj.tables[phase.name]  # TODO: get rid of MetaData here
-    with engine.begin() as conn:
-        stmt = select(
-            *[
-                table.c[key]
-                for key, value in json_obj.items()
-                if value is not None and key != "フェーズ"
-            ]
-        ).where(json_obj["算出方法"] == table.c["算出方法"])
-        if "分類" in json_obj:
-            stmt = stmt.where(json_obj["分類"] == table.c["分類"])
-        result = conn.execute(stmt)
-        df = pd.DataFrame(result, columns=result.keys())
+        db_path = get_db_path(excel_path)
+    df = get_tabular_store(db_path, json_dir).query(json_obj)
     return series, df
 
 
+def query_metric_summary(
+    json_obj: dict[str, Any], db_path: Path | None = None
+) -> pd.DataFrame:
+    """Looks up the precomputed summary of each metric of `json_obj`.
+
+    See `rag_tabular.summary` for the columns.
+    """
+    excel_path: Path = get_rag_tab_path()
+    json_dir = excel_path.parent.joinpath("json")
+    if db_path is None:
+        db_path = get_db_path(excel_path)
+    return get_tabular_store(db_path, json_dir).summary(json_obj)
+
+
 def main():
     rag_tab_path: Path = get_rag_tab_path()
     define_db(rag_tab_path)
@@ -0,0 +1,201 @@
+"""Per-metric summaries of the phase tables, materialized at build time.
+
+For each phase, (算出方法, 分類) and metric, the "metric_summaries" table holds
+the count, min, max and median over all systems together with the sorted
+values, and the "metric_ranks" table holds the value and the percentile rank
+of each system. Where a system sits is then looked up instead of computed
+from all the rows of the phase table.
+
+The percentile rank of a value is the fraction of the systems whose value is
+less than or equal to it.
+"""
+
+import bisect
+import json
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import (
+    Column,
+    Float,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    delete,
+    select,
+)
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Connection
+
+from util.catvar import DevPhase
+
+# NOTE: 指標ではない列
+GROUP_COLUMNS = ("算出方法", "分類")
+
+
+def define_summary_tables() -> MetaData:
+    """Defines the tables of the per-metric summaries."""
+    metadata_obj = MetaData()
+    Table(
+        "metric_summaries",
+        metadata_obj,
+        Column("phase", String, nullable=False),
+        Column("calc_method", String, nullable=False),
+        # NOTE: 分類はフェーズによってはない
+        Column("classification", String, nullable=True),
+        Column("metric", String, nullable=False),
+        Column("count", Integer, nullable=False),
+        Column("min", Float(precision=10), nullable=False),
+        Column("max", Float(precision=10), nullable=False),
+        Column("median", Float(precision=10), nullable=False),
+        # NOTE: 昇順に並べた値のJSON配列
+        Column("sorted_values", String, nullable=False),
+        Index("ix_metric_summaries", "phase", "calc_method", "classification"),
+    )
+    Table(
+        "metric_ranks",
+        metadata_obj,
+        Column("phase", String, nullable=False),
+        Column("calc_method", String, nullable=False),
+        Column("classification", String, nullable=True),
+        Column("metric", String, nullable=False),
+        Column("system", String, nullable=False),
+        Column("value", Float(precision=10), nullable=False),
+        Column("percentile_rank", Float(precision=10), nullable=False),
+        Index("ix_metric_ranks", "phase", "calc_method", "classification", "system"),
+    )
+    return metadata_obj
+
+
+def summarize(
+    df: pd.DataFrame, phase: DevPhase
+) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    """Returns the rows of "metric_summaries" and "metric_ranks" of the phase."""
+    group_columns = [column for column in GROUP_COLUMNS if column in df.columns]
+    metrics = [
+        column for column in df.columns if column not in ["システム", *group_columns]
+    ]
+    long_df = df.melt(
+        id_vars=["システム", *group_columns],
+        value_vars=metrics,
+        var_name="metric",
+        value_name="value",
+    ).dropna(subset=["value"])
+    summaries: list[dict[str, Any]] = []
+    ranks: list[dict[str, Any]] = []
+    for keys, group_df in long_df.groupby([*group_columns, "metric"], sort=False):
+        key = {
+            "phase": phase.name,
+            "calc_method": keys[0],
+            "classification": keys[1] if "分類" in group_columns else None,
+            "metric": keys[-1],
+        }
+        values = group_df["value"].to_numpy(dtype=float)
+        sorted_values = np.sort(values)
+        summaries.append(
+            {
+                **key,
+                "count": len(values),
+                "min": float(sorted_values[0]),
+                "max": float(sorted_values[-1]),
+                "median": float(np.median(sorted_values)),
+                "sorted_values": json.dumps(sorted_values.tolist()),
+            }
+        )
+        percentile_ranks = group_df["value"].rank(method="max", pct=True)
+        ranks.extend(
+            {
+                **key,
+                "system": system,
+                "value": float(value),
+                "percentile_rank": float(percentile_rank),
+            }
+            for system, value, percentile_rank in zip(
+                group_df["システム"], values, percentile_ranks
+            )
+        )
+    return summaries, ranks
+
+
+def build_summaries(
+    conn: Connection,
+    metadata_obj: MetaData,
+    summary_metadata_obj: MetaData,
+    phases: list[DevPhase],
+) -> None:
+    """Recomputes the summaries of the phases from their tables."""
+    for phase in phases:
+        table = metadata_obj.tables[phase.name]
+        df = pd.read_sql(select(table), conn)
+        summaries, ranks = summarize(df, phase)
+        for summary_table, rows in [
+            (summary_metadata_obj.tables["metric_summaries"], summaries),
+            (summary_metadata_obj.tables["metric_ranks"], ranks),
+        ]:
+            stmt = delete(summary_table).where(summary_table.c.phase == phase.name)
+            conn.execute(stmt)
+            if rows:
+                conn.execute(insert(summary_table), rows)
+
+
+def lookup_summary(
+    conn: Connection, summary_metadata_obj: MetaData, json_obj: dict[str, Any]
+) -> pd.DataFrame:
+    """Returns the summary and the percentile rank of each metric of `json_obj`.
+
+    A value of a system already in the database is looked up in
+    "metric_ranks", and any other value is located in the sorted values.
+    """
+    phase = DevPhase.from_ja(json_obj["フェーズ"])
+    summary_table = summary_metadata_obj.tables["metric_summaries"]
+    rank_table = summary_metadata_obj.tables["metric_ranks"]
+    classification = json_obj.get("分類")
+
+    def where(table: Table) -> list:
+        return [
+            table.c.phase == phase.name,
+            table.c.calc_method == json_obj["算出方法"],
+            (
+                table.c.classification.is_(None)
+                if classification is None
+                else table.c.classification == classification
+            ),
+        ]
+
+    stmt = select(summary_table).where(*where(summary_table))
+    summary_rows = conn.execute(stmt).all()
+    stmt = select(rank_table).where(
+        *where(rank_table), rank_table.c.system == json_obj["システム"]
+    )
+    known_ranks = {
+        row.metric: (row.value, row.percentile_rank) for row in conn.execute(stmt)
+    }
+    records = []
+    for row in summary_rows:
+        value = json_obj.get(row.metric)
+        if value is None:
+            continue
+        if row.metric in known_ranks and known_ranks[row.metric][0] == value:
+            percentile_rank = known_ranks[row.metric][1]
+        else:
+            sorted_values = json.loads(row.sorted_values)
+            percentile_rank = (
+                bisect.bisect_right(sorted_values, value) / row._mapping["count"]
+            )
+        records.append(
+            {
+                "指標": row.metric,
+                "値": value,
+                "件数": row._mapping["count"],
+                "最小値": row.min,
+                "中央値": row.median,
+                "最大値": row.max,
+                "百分位": percentile_rank,
+            }
+        )
+    return pd.DataFrame(
+        records, columns=["指標", "値", "件数", "最小値", "中央値", "最大値", "百分位"]
+    ).set_index("指標")
@@ -1,3 +1,5 @@
 from rag_textual.txt_to_db import main
 
-main()
+# NOTE: spawnで起動したワーカーはこのモジュールを読み込み直すので、ここでは実行しない
+if __name__ == "__main__":
+    main()
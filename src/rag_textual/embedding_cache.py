@@ -0,0 +1,188 @@
+"""埋め込みベクトルのキャッシュ
+
+メモリ上のLRUキャッシュと、SQLiteファイルによるディスクキャッシュの2層からなる。
+キーは (埋め込みモデル名, テキストのSHA-256) で、ベクトルはfloat32の配列として保存する。
+"""
+
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+MEMORY_CACHE_SIZE = 1024  # NOTE: メモリ上に保持するベクトルの最大数
+
+
+@dataclass
+class CacheStats:
+    """キャッシュのヒット数とミス数"""
+
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> dict[str, float]:
+        return {**asdict(self), "hits": self.hits, "hit_rate": self.hit_rate}
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_query(text: str) -> str:
+    """クエリを正規化する（Unicode正規化と空白の統一）"""
+    text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """スレッドセーフな2層の埋め込みベクトルキャッシュ
+
+    `db_path` が `None` であるか、ファイルを開けない場合はメモリ上のキャッシュのみを使う。
+    """
+
+    def __init__(self, db_path: Path | None = None, maxsize: int = MEMORY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.stats = CacheStats()
+        self._memory: OrderedDict[tuple[str, str], list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        if db_path is not None:
+            try:
+                self._conn = sqlite3.connect(db_path, check_same_thread=False)
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    "model TEXT NOT NULL, "
+                    "text_hash TEXT NOT NULL, "
+                    "vector BLOB NOT NULL, "
+                    "PRIMARY KEY (model, text_hash)"
+                    ") WITHOUT ROWID"
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"埋め込みキャッシュ {db_path} を開けませんでした: {e}")
+                self._conn = None
+
+    @property
+    def is_persistent(self) -> bool:
+        return self._conn is not None
+
+    def get_many(self, model: str, texts: list[str]) -> list[list[float] | None]:
+        """キャッシュされたベクトルを返す。キャッシュされていないものは `None` とする。"""
+        keys = [(model, text_hash(text)) for text in texts]
+        vectors: list[list[float] | None] = []
+        with self._lock:
+            for key in keys:
+                if (vector := self._memory.get(key)) is not None:
+                    self._memory.move_to_end(key)
+                    self.stats.memory_hits += 1
+                elif (vector := self._load(key)) is not None:
+                    self._remember(key, vector)
+                    self.stats.disk_hits += 1
+                else:
+                    self.stats.misses += 1
+                vectors.append(vector)
+        return vectors
+
+    def get(self, model: str, text: str) -> list[float] | None:
+        return self.get_many(model, [text])[0]
+
+    def put_many(
+        self, model: str, texts: list[str], vectors: list[list[float]]
+    ) -> None:
+        keys = [(model, text_hash(text)) for text in texts]
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector)
+            if self._conn is not None:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                    [
+                        (*key, np.asarray(vector, dtype=np.float32).tobytes())
+                        for key, vector in zip(keys, vectors)
+                    ],
+                )
+                self._conn.commit()
+
+    def put(self, model: str, text: str, vector: list[float]) -> None:
+        self.put_many(model, [text], [vector])
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _remember(self, key: tuple[str, str], vector: list[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def _load(self, key: tuple[str, str]) -> list[float] | None:
+        if self._conn is None:
+            return None
+        row = self._conn.execute(
+            "SELECT vector FROM embeddings WHERE model = ? AND text_hash = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32).tolist()
+
+
+_caches: dict[Path, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(db_path: Path) -> EmbeddingCache:
+    """`db_path` をディスクキャッシュとする、プロセス内で共有されたキャッシュを返す"""
+    db_path = db_path.resolve()
+    with _caches_lock:
+        if db_path not in _caches:
+            _caches[db_path] = EmbeddingCache(db_path)
+        return _caches[db_path]
+
+
+class CachedEmbeddings(Embeddings):
+    """クエリとドキュメントの埋め込みをキャッシュする `Embeddings` のラッパー
+
+    ドキュメントはキャッシュにないものだけをまとめて埋め込む。
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = self.cache.get_many(self.model, texts)
+        missing = [index for index, vector in enumerate(vectors) if vector is None]
+        if missing:
+            missing_texts = [texts[index] for index in missing]
+            missing_vectors = self.embeddings.embed_documents(missing_texts)
+            self.cache.put_many(self.model, missing_texts, missing_vectors)
+            for index, vector in zip(missing, missing_vectors):
+                vectors[index] = vector
+        return vectors  # type: ignore[return-value]
+
+    def embed_query(self, text: str) -> list[float]:
+        text = normalize_query(text)
+        if (vector := self.cache.get(self.model, text)) is not None:
+            return vector
+        vector = self.embeddings.embed_query(text)
+        self.cache.put(self.model, text, vector)
+        return vector
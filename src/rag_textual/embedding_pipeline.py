@@ -0,0 +1,160 @@
+"""チャンクの埋め込みパイプライン
+
+チャンクをバッチに分け、上限付きのスレッドプールで並行して埋め込みAPIを呼ぶ。
+1分あたりのトークン数 (TPM) の上限を超えないようにリクエストを待たせ、
+レート制限などの一時的なエラーで失敗したバッチは指数バックオフで再試行する。
+進捗とスループット (チャンク/秒) を表示する。
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import openai
+from langchain_core.embeddings import Embeddings
+
+from util.tokenizer import get_encoding
+
+EMBD_BATCH_SIZE = 64  # NOTE: 1リクエストあたりのチャンク数
+EMBD_MAX_WORKERS = 4  # NOTE: 同時に送るリクエストの最大数
+EMBD_TOKENS_PER_MINUTE = 1_000_000  # NOTE: 1分あたりのトークン数の上限
+EMBD_MAX_RETRIES = 6
+EMBD_BACKOFF_BASE = 1.0  # NOTE: 再試行までの待ち時間 (秒) の初期値
+EMBD_BACKOFF_MAX = 60.0
+FALLBACK_ENCODING = "cl100k_base"
+
+# NOTE: 再試行すれば成功しうるエラー
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class TokenBucket:
+    """スレッドセーフなトークンバケット (1分あたり `tokens_per_minute` だけ補充される)"""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0  # NOTE: 1秒あたりの補充量
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> float:
+        """`tokens` だけ消費できるまで待ち、待った秒数を返す"""
+        needed = min(float(tokens), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                if self._tokens >= needed:
+                    self._tokens -= needed
+                    return waited
+                wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+def _retry_after(error: Exception) -> float | None:
+    """レスポンスの `Retry-After` ヘッダーが指定する秒数"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers["retry-after"])
+    except (KeyError, ValueError):
+        return None
+
+
+class EmbeddingPipeline(Embeddings):
+    """バッチ化・並行化・レート制限に対応した `Embeddings` のラッパー
+
+    `Chroma.from_documents` などに、元の `Embeddings` の代わりに渡す。
+    再試行はこのパイプラインが行うので、元の `Embeddings` は再試行しない設定にする。
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        batch_size: int = EMBD_BATCH_SIZE,
+        max_workers: int = EMBD_MAX_WORKERS,
+        tokens_per_minute: int = EMBD_TOKENS_PER_MINUTE,
+        max_retries: int = EMBD_MAX_RETRIES,
+        backoff_base: float = EMBD_BACKOFF_BASE,
+        verbose: bool = True,
+    ):
+        self.embeddings = embeddings
+        self.model = model
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.verbose = verbose
+        self.bucket = TokenBucket(tokens_per_minute)
+        self.num_retries = 0
+        self._lock = threading.Lock()
+
+    def count_tokens(self, texts: list[str]) -> int:
+        encoding = get_encoding(self.model, FALLBACK_ENCODING)
+        return sum(len(tokens) for tokens in encoding.encode_batch(texts))
+
+    def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """1バッチを埋め込む。一時的なエラーは指数バックオフで再試行する。"""
+        num_tokens = self.count_tokens(texts)
+        attempt = 0
+        while True:
+            # NOTE: 再試行もトークンを消費するので、試行ごとにバケットから取る
+            self.bucket.acquire(num_tokens)
+            try:
+                return self.embeddings.embed_documents(texts)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                backoff = min(self.backoff_base * 2**attempt, EMBD_BACKOFF_MAX)
+                wait = max(backoff * (0.5 + random.random() / 2), _retry_after(e) or 0)
+                attempt += 1
+                with self._lock:
+                    self.num_retries += 1
+                if self.verbose:
+                    print(f"埋め込みを{wait:.1f}秒後に再試行します: {e}")
+                time.sleep(wait)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        batches = [
+            texts[start : start + self.batch_size]
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        results: list[list[list[float]]] = [[] for _ in batches]
+        start_time = time.perf_counter()
+        num_done = 0
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {
+                executor.submit(self.embed_batch, batch): index
+                for index, batch in enumerate(batches)
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                results[index] = future.result()
+                num_done += len(batches[index])
+                if self.verbose:
+                    elapsed = max(time.perf_counter() - start_time, 1e-9)
+                    print(
+                        f"埋め込み: {num_done}/{len(texts)} チャンク "
+                        f"({num_done / elapsed:.1f} チャンク/秒)"
+                    )
+        finally:
+            # NOTE: 失敗したら残りのバッチは送らない
+            executor.shutdown(wait=True, cancel_futures=True)
+        return [vector for result in results for vector in result]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings.embed_query(text)
@@ -1,10 +1,16 @@
 """作成したChromaDBから、クエリに基づいてベクトル検索を行う"""
 
+import threading
 from pathlib import Path
 
 from langchain_community.vectorstores.chroma import Chroma
 
-from rag_textual.txt_to_db import get_ipa_db_path
+from rag_textual.embedding_cache import CachedEmbeddings, get_embedding_cache
+from rag_textual.txt_to_db import (
+    forget_chroma_system,
+    get_embedding_cache_path,
+    get_ipa_db_path,
+)
 from util.api import API
 
 # ChromaDBから取得する最大の数を指定
@@ -12,18 +18,67 @@ MAX_RETRIEVE = 5
 QUERY = "IPA白書によると、基本設計レビュー実績工数の中央値はどのぐらいの値でしょうか?"
 
 
+# NOTE: (DBのディレクトリ, API設定) -> (DBのシグネチャ, ロード済みのDB)
+_db_registry: dict[tuple[str, str], tuple[tuple | None, Chroma]] = {}
+_db_registry_lock = threading.Lock()
+
+
+def db_signature(persist_directory: Path) -> tuple | None:
+    """DBのディレクトリが再作成・更新された場合に変化する値を返す"""
+    try:
+        dir_stat = persist_directory.stat()
+        sqlite_stat = persist_directory.joinpath("chroma.sqlite3").stat()
+    except FileNotFoundError:
+        return None
+    return (
+        dir_stat.st_ino,
+        sqlite_stat.st_ino,
+        sqlite_stat.st_mtime_ns,
+        sqlite_stat.st_size,
+    )
+
+
 def load_db(
     api: API,
     persist_directory: Path | None = None,
 ) -> Chroma:
-    """ChromaDBのロード"""
-    embeddings = api.init_embd_model()
+    """ChromaDBのロード
+
+    ロードしたDBはプロセス内で共有され、DBのディレクトリが変化した場合のみ再ロードされる。
+    クエリの埋め込みベクトルはキャッシュされる。
+    """
     if persist_directory is None:
         persist_directory = get_ipa_db_path()
-    db = Chroma(persist_directory=str(persist_directory), embedding_function=embeddings)
+    persist_directory = Path(persist_directory).resolve()
+    key = (str(persist_directory), api.config.fingerprint())
+    with _db_registry_lock:
+        signature = db_signature(persist_directory)
+        if key in _db_registry:
+            loaded_signature, db = _db_registry[key]
+            if loaded_signature == signature:
+                return db
+            forget_chroma_system(str(persist_directory))
+        embeddings = CachedEmbeddings(
+            api.init_embd_model(),
+            model=api.config.embd_model_name,
+            cache=get_embedding_cache(get_embedding_cache_path(persist_directory)),
+        )
+        db = Chroma(
+            persist_directory=str(persist_directory), embedding_function=embeddings
+        )
+        # NOTE: ロード時にChromaDB自身がファイルを作成することがあるので、ロード後に取得
+        _db_registry[key] = (db_signature(persist_directory), db)
     return db
 
 
+def clear_db_registry() -> None:
+    """ロード済みのDBを全て破棄する"""
+    with _db_registry_lock:
+        for persist_directory, _ in _db_registry:
+            forget_chroma_system(persist_directory)
+        _db_registry.clear()
+
+
 def _documents_to_dicts(query: str, context_docs: list) -> list:
     """抽出したドキュメントのリストをjson形式のリストに変換"""
     docs_as_dicts = []
@@ -1,15 +1,43 @@
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
 import os
+import queue
 import re
 import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from multiprocessing.context import BaseContext
 from pathlib import Path
-from typing import List
+from typing import Iterable, Iterator, List
 
 import neologdn
+from chromadb.api.client import SharedSystemClient
 from langchain_community.vectorstores.chroma import Chroma
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
 from langchain_text_splitters import CharacterTextSplitter
 
+from rag_textual.embedding_cache import CachedEmbeddings, get_embedding_cache
+from rag_textual.embedding_pipeline import (
+    EMBD_BATCH_SIZE,
+    EMBD_MAX_WORKERS,
+    EMBD_TOKENS_PER_MINUTE,
+    EmbeddingPipeline,
+)
+
+PAGE_SEPARATOR = "\n\n"  # NOTE: `insert_newlines` がページの前に挿入する区切り
+READ_BLOCK_SIZE = 1 << 16  # NOTE: ファイルを読む単位 (文字数) の目安
+# NOTE: まとめてChromaDBに追加するチャンク数 (埋め込みパイプラインの並行数の分)
+STORE_BATCH_SIZE = EMBD_BATCH_SIZE * EMBD_MAX_WORKERS
+PREFETCH_SIZE = 4 * STORE_BATCH_SIZE  # NOTE: 埋め込み中に先読みしておくチャンク数
+
 
 def get_rag_txt_path() -> Path:
     """Returns the path to the text file representing the IPA whitepaper.
@@ -33,18 +61,143 @@ def get_rag_txt_path() -> Path:
     return rag_txt_path
 
 
+def resolve_sources(sources: Iterable[str]) -> list[Path]:
+    """Resolves files, directories and glob patterns into text files to index.
+
+    A directory stands for the `.txt` files directly under it.
+
+    Raises: `ValueError` if a source matches no text file.
+    """
+    paths: list[Path] = []
+    for source in sources:
+        if Path(source).is_dir():
+            matches = sorted(Path(source).glob("*.txt"))
+        elif glob.has_magic(source):
+            matches = sorted(Path(p) for p in glob.glob(source, recursive=True))
+        else:
+            matches = [Path(source)]
+        matches = [path for path in matches if path.is_file() and path.suffix == ".txt"]
+        if not matches:
+            raise ValueError(
+                f"{source} に一致するテキスト (.txt) ファイルがありません。"
+            )
+        paths += [path for path in matches if path not in paths]
+    return paths
+
+
+def get_rag_txt_sources() -> list[Path]:
+    """Returns the paths to the text files to index into the vector database.
+
+    The environment variable `RAG_TXT_SOURCES` lists files, directories and glob
+    patterns separated by `os.pathsep`; defaults to the file of `RAG_TXT_PATH`.
+    """
+    if (_rag_txt_sources := os.getenv("RAG_TXT_SOURCES")) is not None:
+        return resolve_sources(_rag_txt_sources.split(os.pathsep))
+    return [get_rag_txt_path()]
+
+
 def get_ipa_db_path() -> Path:
-    """Returns the path to the vector database of IPA whitepaper."""
+    """Returns the path to the vector database of IPA whitepaper.
+
+    Can be overridden by the environment variable `RAG_TXT_DB_PATH`, which
+    makes `RAG_TXT_PATH` unnecessary.
+    """
+    if (_ipa_db_path := os.getenv("RAG_TXT_DB_PATH")) is not None:
+        return Path(_ipa_db_path)
     rag_txt_path = get_rag_txt_path()
     # if rag_txt_path is /foo/IPA_2018-2019.txt,
     # then ipa_db_path is /foo/IPA_2018-2019_chroma_db.
     return rag_txt_path.parent.joinpath(f"{rag_txt_path.stem}_chroma_db")
 
 
+def get_embedding_cache_path(ipa_db_path: Path | None = None) -> Path:
+    """Returns the path to the on-disk cache of embedding vectors.
+
+    The cache is placed next to the vector database `ipa_db_path`
+    (`get_ipa_db_path()` if None).
+    Can be overridden by the environment variable `RAG_EMBD_CACHE_PATH`.
+    """
+    if (_embedding_cache_path := os.getenv("RAG_EMBD_CACHE_PATH")) is not None:
+        return Path(_embedding_cache_path)
+    if ipa_db_path is None:
+        ipa_db_path = get_ipa_db_path()
+    # if ipa_db_path is /foo/IPA_2018-2019_chroma_db,
+    # then embedding_cache_path is /foo/IPA_2018-2019_embeddings.sqlite3.
+    stem = ipa_db_path.name.removesuffix("_chroma_db")
+    return ipa_db_path.parent.joinpath(f"{stem}_embeddings.sqlite3")
+
+
+def read_blocks(file_path: Path, block_size: int = READ_BLOCK_SIZE) -> Iterator[str]:
+    """ファイルを行単位で、`block_size` 文字程度のブロックごとに読む
+
+    数字で終わる行の直後では区切らないので、`insert_newlines` の置換はブロックをまたがない。
+    """
+    lines: list[str] = []
+    size = 0
+    with open(file_path, "r", encoding="utf-8") as file:
+        for line in file:
+            lines.append(line)
+            size += len(line)
+            if size >= block_size and not line.rstrip("\n")[-1:].isdigit():
+                yield "".join(lines)
+                lines, size = [], 0
+    if lines:
+        yield "".join(lines)
+
+
+def prefetch(iterable: Iterable, maxsize: int = PREFETCH_SIZE) -> Iterator:
+    """`iterable` をバックグラウンドのスレッドで最大 `maxsize` 個まで先読みする"""
+    items: queue.Queue = queue.Queue(maxsize=maxsize)
+    done = object()
+    errors: list[BaseException] = []
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put(item)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            items.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while (item := items.get()) is not done:
+        yield item
+    if errors:
+        raise errors[0]
+
+
+def forget_chroma_system(persist_directory: str) -> None:
+    """ChromaDBがディレクトリごとに共有しているシステムを破棄する"""
+    # NOTE: 破棄しないと、次のChromaの構築でも古いインデックスが使い回される
+    SharedSystemClient._identifer_to_system.pop(persist_directory, None)
+
+
+def chunk_id(doc: Document) -> str:
+    """チャンクのID (内容とメタデータのSHA-256)"""
+    content = json.dumps(
+        [doc.page_content, doc.metadata], ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
 class TextProcessor:
-    def __init__(self, embedding_model: str, knowledge_path: str):
+    def __init__(
+        self,
+        embedding_model: str,
+        knowledge_path: str,
+        batch_size: int = EMBD_BATCH_SIZE,
+        max_workers: int = EMBD_MAX_WORKERS,
+        tokens_per_minute: int = EMBD_TOKENS_PER_MINUTE,
+        embedding_cache_path: Path | None = None,
+    ):
         self.embedding_model = embedding_model
         self.knowledge_path = knowledge_path
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.tokens_per_minute = tokens_per_minute
+        # NOTE: Noneならば埋め込みをキャッシュしない
+        self.embedding_cache_path = embedding_cache_path
 
     def clean_text(self, text: str) -> str:
         """テキストのクリーニング処理"""
@@ -72,38 +225,284 @@ class TextProcessor:
         )
         return text_splitter.create_documents([text])
 
+    def iter_pages(
+        self, blocks: Iterable[str], specific_strings: list
+    ) -> Iterator[tuple[str, int | None]]:
+        """ブロックごとにページに区切り、ページごとにクリーニングする
+
+        ページは `PAGE_SEPARATOR` で区切られた部分で、
+        空でないものをページ番号と組にして `CharacterTextSplitter` と同じ順に返す。
+        ページ番号は `insert_newlines` が区切った直前のマーカーの番号 (なければNone)。
+        テキスト全体をクリーニングする場合とは、ページの先頭と末尾の空白だけが異なりうる。
+        """
+        marker = re.compile(
+            r"\s*(\d+)(?:" + "|".join(re.escape(s) for s in specific_strings) + ")"
+        )
+        page_number: int | None = None
+        rest = ""
+        for block in blocks:
+            pages = (rest + self.insert_newlines(block, specific_strings)).split(
+                PAGE_SEPARATOR
+            )
+            rest = pages.pop()  # NOTE: 次のブロックに続きうる
+            for page in pages:
+                if match := marker.match(page):
+                    page_number = int(match[1])
+                if page := self.clean_text(page):
+                    yield page, page_number
+        if match := marker.match(rest):
+            page_number = int(match[1])
+        if rest := self.clean_text(rest):
+            yield rest, page_number
+
+    def merge_pages(
+        self,
+        pages: Iterable[tuple[str, int | None]],
+        separator=PAGE_SEPARATOR,
+        chunk_size=512,
+        chunk_overlap=128,
+    ) -> Iterator[tuple[str, int | None]]:
+        """ページをチャンクにまとめる
+
+        `CharacterTextSplitter` と同じ規則で、ページを受け取るたびにできたチャンクを、
+        その最初のページのページ番号と組にして返す。
+        """
+        current: list[tuple[str, int | None]] = []
+        total = 0
+        for page, page_number in pages:
+            if total + len(page) + (len(separator) if current else 0) > chunk_size:
+                if current:
+                    if chunk := separator.join(p for p, _ in current).strip():
+                        yield chunk, current[0][1]
+                    while total > chunk_overlap or (
+                        total + len(page) + (len(separator) if current else 0)
+                        > chunk_size
+                        and total > 0
+                    ):
+                        total -= len(current[0][0]) + (
+                            len(separator) if len(current) > 1 else 0
+                        )
+                        current = current[1:]
+            current.append((page, page_number))
+            total += len(page) + (len(separator) if len(current) > 1 else 0)
+        if chunk := separator.join(p for p, _ in current).strip():
+            yield chunk, current[0][1]
+
+    def iter_documents(
+        self,
+        file_path: Path,
+        specific_strings: list,
+        block_size: int = READ_BLOCK_SIZE,
+    ) -> Iterator[Document]:
+        """ファイルを少しずつ読み、チャンクができるたびに返す
+
+        `insert_newlines`, `clean_text`, `split_text_into_chunks` をファイル全体に
+        適用する代わりに使う。クリーニングはページごとに行う。
+        チャンクのメタデータは、ファイル名 (`source`) とページ番号 (`page`)。
+        """
+        pages = self.iter_pages(read_blocks(file_path, block_size), specific_strings)
+        for chunk, page_number in self.merge_pages(pages):
+            # NOTE: ChromaDBのメタデータにはNoneを入れられない
+            metadata: dict = {"source": file_path.name}
+            if page_number is not None:
+                metadata["page"] = page_number
+            yield Document(page_content=chunk, metadata=metadata)
+
+    def load_documents(self, file_path: Path, specific_strings: list) -> list[Document]:
+        """1ファイルのチャンク (プロセスプールのワーカーで実行する)"""
+        return list(self.iter_documents(file_path, specific_strings))
+
+    def iter_corpus_documents(
+        self,
+        file_paths: list[Path],
+        specific_strings: list,
+        max_processes: int | None = None,
+        mp_context: BaseContext | None = None,
+    ) -> Iterator[Document]:
+        """複数のファイルのチャンクを、ファイルの順に返す
+
+        正規化とチャンキングはCPUを使うので、ファイルごとにプロセスプールで並列に行う。
+        `max_processes` はプロセス数の上限 (Noneならば `os.cpu_count()`)。
+        `mp_context` はワーカーの起動方法 (Noneならばプラットフォームの既定)。
+        ファイルが1つかプロセス数が1ならば、このプロセスで少しずつ読む。
+        """
+        if max_processes is None:
+            max_processes = os.cpu_count() or 1
+        max_processes = min(max_processes, len(file_paths))
+        if max_processes <= 1:
+            for file_path in file_paths:
+                yield from self.iter_documents(file_path, specific_strings)
+            return
+        executor = ProcessPoolExecutor(max_workers=max_processes, mp_context=mp_context)
+        try:
+            # NOTE: 全ファイルのチャンクを抱えないように、処理中のファイルは
+            #   `max_processes` 個までにし、1つ受け取るたびに次のファイルを投入する
+            remaining = iter(file_paths)
+            futures: deque[Future[list[Document]]] = deque(
+                executor.submit(self.load_documents, file_path, specific_strings)
+                for file_path in islice(remaining, max_processes)
+            )
+            while futures:
+                docs = futures.popleft().result()
+                for file_path in islice(remaining, 1):
+                    futures.append(
+                        executor.submit(
+                            self.load_documents, file_path, specific_strings
+                        )
+                    )
+                yield from docs
+                del docs
+        finally:
+            # NOTE: 途中で止まったら残りのファイルは処理しない
+            executor.shutdown(wait=True, cancel_futures=True)
+
     def initialize_embeddings(self) -> OpenAIEmbeddings:
         """OpenAIのEmbeddingモデルの初期化"""
-        return OpenAIEmbeddings(model=self.embedding_model)
+        # NOTE: 再試行は埋め込みパイプラインに任せる
+        #   (クライアント自身の再試行はトークンバケットを通らない)
+        return OpenAIEmbeddings(model=self.embedding_model, max_retries=0)
+
+    def embedding_pipeline(self, embeddings: Embeddings) -> Embeddings:
+        """バッチ化・並行化・レート制限をする埋め込みパイプライン
+
+        埋め込みキャッシュがあれば、キャッシュにないチャンクだけをパイプラインに渡す。
+        """
+        pipeline: Embeddings = EmbeddingPipeline(
+            embeddings,
+            self.embedding_model,
+            batch_size=self.batch_size,
+            max_workers=self.max_workers,
+            tokens_per_minute=self.tokens_per_minute,
+        )
+        if self.embedding_cache_path is not None:
+            pipeline = CachedEmbeddings(
+                pipeline,
+                model=self.embedding_model,
+                cache=get_embedding_cache(self.embedding_cache_path),
+            )
+        return pipeline
 
-    def store_documents(self, docs: List[Document], embeddings: OpenAIEmbeddings):
-        """ChromaDBの作成と保存。既存のDBがあれば削除。"""
+    def store_documents(
+        self,
+        docs: Iterable[Document],
+        embeddings: Embeddings,
+        full_rebuild: bool = False,
+    ):
+        """ChromaDBの作成と保存
+
+        チャンクのIDは内容のハッシュで、既存のDBには新しいチャンクだけを埋め込んで追加し、
+        なくなったチャンクを削除する。`full_rebuild` ならば既存のDBを削除して作り直す。
+        `docs` はイテレータでもよく、`STORE_BATCH_SIZE` 個ずつ埋め込んで追加する。
+        """
         persist_dir = Path(self.knowledge_path)
-        if persist_dir.exists():
+        if full_rebuild and persist_dir.exists():
             shutil.rmtree(persist_dir)
+            forget_chroma_system(str(persist_dir))
             print(f"既存のChromaDBを削除しました: {persist_dir.resolve()}")
 
-        db = Chroma.from_documents(docs, embeddings, persist_directory=str(persist_dir))
-        print(f"新しいChromaDBを作成しました: {persist_dir.resolve()}")
+        embedding_function = self.embedding_pipeline(embeddings)
+        db = Chroma(
+            persist_directory=str(persist_dir), embedding_function=embedding_function
+        )
+        start_time = time.perf_counter()
+        existing_ids = set(db.get(include=[])["ids"])
+        seen_ids: set[str] = set()
+        new_docs: dict[str, Document] = {}
+        num_added = 0
+        for doc in docs:
+            id_ = chunk_id(doc)
+            if id_ in seen_ids:
+                continue  # NOTE: 同じ内容のチャンクは1つにまとめる
+            seen_ids.add(id_)
+            if id_ not in existing_ids:
+                new_docs[id_] = doc
+            if len(new_docs) >= STORE_BATCH_SIZE:
+                db.add_documents(list(new_docs.values()), ids=list(new_docs))
+                num_added += len(new_docs)
+                new_docs.clear()
+        if new_docs:
+            db.add_documents(list(new_docs.values()), ids=list(new_docs))
+            num_added += len(new_docs)
+        vanished_ids = list(existing_ids - seen_ids)
+        if vanished_ids:
+            db.delete(ids=vanished_ids)
+        print(
+            f"ChromaDBを更新しました: {persist_dir.resolve()} "
+            f"(追加 {num_added}, 削除 {len(vanished_ids)}, "
+            f"維持 {len(seen_ids) - num_added}, "
+            f"{time.perf_counter() - start_time:.1f}秒)"
+        )
+        if isinstance(embedding_function, CachedEmbeddings):
+            stats = embedding_function.cache.stats
+            print(
+                f"埋め込みキャッシュ: ヒット {stats.hits}, ミス {stats.misses} "
+                f"(ヒット率 {stats.hit_rate:.1%})"
+            )
         return db.as_retriever()
 
 
-def main():
-    ipa_db_path = get_ipa_db_path()
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="IPA白書のテキストからChromaDBを作成する"
+    )
+    parser.add_argument(
+        "sources",
+        nargs="*",
+        help="テキストファイル・ディレクトリ・globパターン "
+        "(省略時は環境変数RAG_TXT_SOURCESかRAG_TXT_PATH)",
+    )
+    parser.add_argument(
+        "--full-rebuild",
+        action="store_true",
+        help="差分更新せずにChromaDBを作り直す",
+    )
+    parser.add_argument(
+        "--persist-directory",
+        type=Path,
+        default=None,
+        help="ChromaDBのディレクトリ (省略時は環境変数RAG_TXT_DB_PATHか、"
+        "RAG_TXT_PATHのファイルの隣)",
+    )
+    parser.add_argument(
+        "--max-processes",
+        type=int,
+        default=None,
+        help="正規化とチャンキングに使うプロセス数の上限 (省略時はCPU数)",
+    )
+    args = parser.parse_args(argv)
+    if (
+        args.persist_directory is None
+        and os.getenv("RAG_TXT_DB_PATH") is None
+        and os.getenv("RAG_TXT_PATH") is None
+    ):
+        parser.error(
+            "ChromaDBのディレクトリを--persist-directoryか環境変数RAG_TXT_DB_PATHで"
+            "指定してください (RAG_TXT_PATHを設定すれば、そのファイルの隣に作成します)。"
+        )
+    ipa_db_path = args.persist_directory or get_ipa_db_path()
     processor = TextProcessor(
         embedding_model="text-embedding-3-small",
-        knowledge_path=ipa_db_path,
+        knowledge_path=str(ipa_db_path),
+        embedding_cache_path=get_embedding_cache_path(ipa_db_path),
     )
-    rag_txt_path = get_rag_txt_path()
-    with open(rag_txt_path, "r", encoding="utf-8") as file:
-        text = file.read()
-
+    rag_txt_paths = (
+        resolve_sources(args.sources) if args.sources else get_rag_txt_sources()
+    )
+    print(f"{len(rag_txt_paths)}個のファイルからChromaDBを作成します")
     specific_strings = ["ソフトウェア開発データ白書", "● ソフトウェア開発データ白書"]
-    text = processor.insert_newlines(text, specific_strings)
-    text = processor.clean_text(text)
-    docs = processor.split_text_into_chunks(text)
+    # NOTE: 埋め込み中も次のチャンクを作っておく
+    docs = prefetch(
+        processor.iter_corpus_documents(
+            rag_txt_paths,
+            specific_strings,
+            max_processes=args.max_processes,
+            # NOTE: 先読みと埋め込みのスレッドが動いている最中にforkしないように、
+            #   spawnで起動する
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    )
     embeddings = processor.initialize_embeddings()
-    processor.store_documents(docs, embeddings)
+    processor.store_documents(docs, embeddings, full_rebuild=args.full_rebuild)
 
 
 if __name__ == "__main__":
@@ -1,10 +1,18 @@
 """Implementation of api-related utilities."""
 
+import asyncio
+import hashlib
 import os
-from collections import namedtuple
-from dataclasses import dataclass
+import threading
+import time
+import weakref
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
 from enum import Enum
+from typing import Any, Callable, Sequence
 
+import httpx
 import openai
 from langchain_openai import (
     AzureChatOpenAI,
@@ -19,11 +27,171 @@ _APITypeInfo = namedtuple("_APITypeInfo", ["index", "name"])
 MAX_TOKENS = 4000
 TEMPERAURE = 0.7
 
+CLIENT_POOL_SIZE = 16  # NOTE: プールに保持するAPI設定の組の最大数
+KEEPALIVE_EXPIRY = 60.0  # NOTE: アイドル状態のHTTP接続を保持する秒数
+VALIDATION_TTL = 60 * 60.0  # NOTE: 検証に成功したAPI設定を再検証しない秒数
+
 
 class InvalidAPIError(Exception):
     pass
 
 
+class ClientPool:
+    """Thread-safe LRU pool of API clients and LangChain model objects.
+
+    Entries are keyed by `(config fingerprint, kind)`, so that every Streamlit
+    session and rerun using the same API config shares the same objects.
+    All pooled objects share a single `httpx.Client`, hence its keep-alive
+    connections.
+
+    Async clients and models are pooled per event loop by `get_async`,
+    since their connections cannot be shared across loops, and are dropped
+    together with their loop.
+    """
+
+    def __init__(self, maxsize: int = CLIENT_POOL_SIZE):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[tuple[str, str], Any] = OrderedDict()
+        self._lock = threading.RLock()
+        self._http_client: httpx.Client | None = None
+        self._async_entries: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, dict[tuple[str, str], Any]
+        ] = weakref.WeakKeyDictionary()
+
+    @property
+    def http_client(self) -> httpx.Client:
+        """Returns the HTTP client shared by all pooled objects."""
+        with self._lock:
+            if self._http_client is None or self._http_client.is_closed:
+                default_limits = openai.DEFAULT_CONNECTION_LIMITS
+                self._http_client = httpx.Client(
+                    timeout=openai.DEFAULT_TIMEOUT,
+                    limits=httpx.Limits(
+                        max_connections=default_limits.max_connections,
+                        max_keepalive_connections=(
+                            default_limits.max_keepalive_connections
+                        ),
+                        keepalive_expiry=KEEPALIVE_EXPIRY,
+                    ),
+                    follow_redirects=True,
+                )
+            return self._http_client
+
+    def get(self, key: tuple[str, str], factory: Callable[[], Any]) -> Any:
+        """Returns the object for `key`, creating it with `factory` if absent."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            obj = factory()
+            self._entries[key] = obj
+            # NOTE: 使用中のセッションがあり得るので、追い出したオブジェクトは閉じない
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return obj
+
+    def get_async(self, key: tuple[str, str], factory: Callable[[], Any]) -> Any:
+        """Returns the object for `key` in the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entries = self._async_entries.setdefault(loop, {})
+            if key not in entries:
+                entries[key] = factory()
+            return entries[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key: tuple[str, str]) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._async_entries.clear()
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+
+
+client_pool = ClientPool()
+
+
+class ValidationCache:
+    """Thread-safe set of successfully validated API configs with a TTL.
+
+    Only hashes of the configs are kept, never the credentials themselves.
+    Failures are not cached, so that a transient error can be retried.
+    """
+
+    def __init__(self, ttl: float = VALIDATION_TTL):
+        self.ttl = ttl
+        self._expires_at: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            expires_at = self._expires_at.get(key)
+            if expires_at is None:
+                return False
+            if expires_at < time.monotonic():
+                del self._expires_at[key]
+                return False
+            return True
+
+    def add(self, key: str) -> None:
+        with self._lock:
+            self._expires_at[key] = time.monotonic() + self.ttl
+
+    def clear(self) -> None:
+        with self._lock:
+            self._expires_at.clear()
+
+
+validation_cache = ValidationCache()
+
+
+class ValidationMode(Enum):
+    """When and how an API config is validated."""
+
+    EAGER = "eager"  # NOTE: インスタンス化の際に、モデルを1つずつ取得して検証
+    CONCURRENT = "concurrent"  # NOTE: インスタンス化の際に、モデルを並行に取得して検証
+    LAZY = "lazy"  # NOTE: クライアントやモデルを初めて利用する際に検証
+
+
+def config_fingerprint(config: Any, names: Sequence[str] | None = None) -> str:
+    """Returns a hash identifying the dataclass `config` by its field values.
+
+    If `names` is given, only those fields are taken into account.
+    """
+    if names is None:
+        names = [f.name for f in fields(config) if f.compare]
+    items = [(name, getattr(config, name)) for name in names]
+    return hashlib.sha256(
+        repr((type(config).__name__, items)).encode("utf-8")
+    ).hexdigest()
+
+
+def _retrieve_models(
+    client: openai.OpenAI, model_names: list[str], concurrent: bool
+) -> list[Exception | None]:
+    """Retrieves the models, and returns the exception raised for each of them."""
+
+    def retrieve(model_name: str) -> Exception | None:
+        try:
+            client.models.retrieve(model_name)
+        except Exception as e:
+            return e
+        return None
+
+    if not concurrent:
+        return [retrieve(model_name) for model_name in model_names]
+    with ThreadPoolExecutor(max_workers=len(model_names)) as executor:
+        return list(executor.map(retrieve, model_names))
+
+
 class APIType(Enum):
     AZURE_OPENAI = _APITypeInfo(0, "Azure OpenAI")
     OPENAI = _APITypeInfo(1, "OpenAI")
@@ -48,6 +216,19 @@ class OpenAIAPIConfig:
     max_tokens: int = MAX_TOKENS
     embd_model_name: str = "text-embedding-ada-002"
 
+    validation_mode: ValidationMode = field(
+        default=ValidationMode.CONCURRENT, compare=False
+    )
+    _validated: bool = field(default=False, init=False, repr=False, compare=False)
+
+    _VALIDATION_FIELDS = (
+        "openai_api_key",
+        "openai_base_url",
+        "openai_org_id",
+        "chat_model_name",
+        "embd_model_name",
+    )
+
     def __post_init__(self):
         if self.openai_api_key is None:
             self.openai_api_key = os.getenv("OPENAI_API_KEY")
@@ -57,54 +238,120 @@ class OpenAIAPIConfig:
             )
         if self.openai_org_id is None:
             self.openai_org_id = os.getenv("OPENAI_ORG_ID")
-        self.validate()
+        if self.validation_mode is not ValidationMode.LAZY:
+            self.validate()
 
     @classmethod
     def from_env(cls) -> "OpenAIAPIConfig":
         return cls()
 
+    def fingerprint(self) -> str:
+        return config_fingerprint(self)
+
+    def validation_key(self) -> str:
+        return config_fingerprint(self, self._VALIDATION_FIELDS)
+
     def validate(self) -> None:
-        """Validates an OpenAI API key."""
+        """Validates an OpenAI API key.
+
+        Skips the round-trips if the same config was validated recently.
+        """
+        if (validation_key := self.validation_key()) in validation_cache:
+            self._validated = True
+            return
         try:
-            client = self.init_openai_client()
+            client = self._pooled("client", self._build_openai_client)
         except Exception:
             raise InvalidAPIError("OpenAIクライアントの初期化に失敗しました。")
         try:
-            self.init_chat_model()
+            self._pooled("chat", self._build_chat_model)
         except Exception:
             raise InvalidAPIError("チャットモデルの初期化に失敗しました。")
         try:
-            self.init_embd_model()
+            self._pooled("embd", self._build_embd_model)
         except Exception:
             raise InvalidAPIError("埋め込みモデルの初期化に失敗しました。")
-        try:
-            client.models.retrieve(self.chat_model_name)
-        except Exception:
+        chat_error, embd_error = _retrieve_models(
+            client,
+            [self.chat_model_name, self.embd_model_name],
+            concurrent=self.validation_mode is not ValidationMode.EAGER,
+        )
+        if chat_error is not None:
             raise InvalidAPIError("チャットモデルの取得に失敗しました。")
-        try:
-            client.models.retrieve(self.embd_model_name)
-        except Exception:
+        if embd_error is not None:
             raise InvalidAPIError("埋め込みモデルの取得に失敗しました。")
+        validation_cache.add(validation_key)
+        self._validated = True
 
     def init_openai_client(self) -> openai.OpenAI:
+        self._ensure_validated()
+        return self._pooled("client", self._build_openai_client)
+
+    def init_chat_model(self) -> ChatOpenAI:
+        self._ensure_validated()
+        return self._pooled("chat", self._build_chat_model)
+
+    def init_embd_model(self) -> OpenAIEmbeddings:
+        self._ensure_validated()
+        return self._pooled("embd", self._build_embd_model)
+
+    def init_async_openai_client(self) -> openai.AsyncOpenAI:
+        self._ensure_validated()
+        return self._pooled_async("client", self._build_async_openai_client)
+
+    def init_async_chat_model(self) -> ChatOpenAI:
+        self._ensure_validated()
+        return self._pooled_async("chat", self._build_async_chat_model)
+
+    def _ensure_validated(self) -> None:
+        if not self._validated:
+            self.validate()
+
+    def _pooled(self, kind: str, factory: Callable[[], Any]) -> Any:
+        return client_pool.get((self.fingerprint(), kind), factory)
+
+    def _pooled_async(self, kind: str, factory: Callable[[], Any]) -> Any:
+        return client_pool.get_async((self.fingerprint(), kind), factory)
+
+    def _build_openai_client(self) -> openai.OpenAI:
         return openai.OpenAI(
             api_key=self.openai_api_key,
             base_url=self.openai_base_url,
             organization=self.openai_org_id,
+            http_client=client_pool.http_client,
         )
 
-    def init_chat_model(self) -> ChatOpenAI:
+    def _build_async_openai_client(self) -> openai.AsyncOpenAI:
+        return openai.AsyncOpenAI(
+            api_key=self.openai_api_key,
+            base_url=self.openai_base_url,
+            organization=self.openai_org_id,
+        )
+
+    def _build_chat_model(self) -> ChatOpenAI:
         return ChatOpenAI(
-            client=self.init_openai_client().chat.completions,
+            client=self._pooled("client", self._build_openai_client).chat.completions,
             api_key=self.openai_api_key,  # type: ignore[arg-type]
             model=self.chat_model_name,
             temperature=self.temperature,
             max_tokens=self.max_tokens,
         )
 
-    def init_embd_model(self) -> OpenAIEmbeddings:
+    def _build_async_chat_model(self) -> ChatOpenAI:
+        return ChatOpenAI(
+            client=self._pooled("client", self._build_openai_client).chat.completions,
+            async_client=self._pooled_async(
+                "client", self._build_async_openai_client
+            ).chat.completions,
+            api_key=self.openai_api_key,  # type: ignore[arg-type]
+            model=self.chat_model_name,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+        )
+
+    def _build_embd_model(self) -> OpenAIEmbeddings:
         return OpenAIEmbeddings(
-            client=self.init_openai_client().embeddings,
+            client=self._pooled("client", self._build_openai_client).embeddings,
             api_key=self.openai_api_key,  # type: ignore[arg-type]
             model=self.embd_model_name,
         )
@@ -122,6 +369,20 @@ class AzureOpenAIAPIConfig:
     max_tokens: int = MAX_TOKENS
     embd_model_name: str = "text-embedding-ada-002"
 
+    validation_mode: ValidationMode = field(
+        default=ValidationMode.CONCURRENT, compare=False
+    )
+    _validated: bool = field(default=False, init=False, repr=False, compare=False)
+
+    _VALIDATION_FIELDS = (
+        "azure_openai_ad_token",
+        "azure_openai_api_key",
+        "azure_openai_endpoint",
+        "openai_api_version",
+        "chat_model_name",
+        "embd_model_name",
+    )
+
     def __post_init__(self):
         if self.azure_openai_ad_token is None:
             self.azure_openai_ad_token = os.getenv("AZURE_OPENAI_AD_TOKEN")
@@ -133,24 +394,37 @@ class AzureOpenAIAPIConfig:
             self.openai_api_version = (
                 os.getenv("OPENAI_API_VERSION") or "2023-07-01-preview"
             )
-        self.validate()
+        if self.validation_mode is not ValidationMode.LAZY:
+            self.validate()
 
     @classmethod
     def from_env(cls) -> "AzureOpenAIAPIConfig":
         return cls()
 
+    def fingerprint(self) -> str:
+        return config_fingerprint(self)
+
+    def validation_key(self) -> str:
+        return config_fingerprint(self, self._VALIDATION_FIELDS)
+
     def validate(self) -> None:
-        """Validates an OpenAI API key."""
+        """Validates an OpenAI API key.
+
+        Skips the validation if the same config was validated recently.
+        """
+        if (validation_key := self.validation_key()) in validation_cache:
+            self._validated = True
+            return
         try:
-            self.init_openai_client()
+            self._pooled("client", self._build_openai_client)
         except Exception:
             raise InvalidAPIError("OpenAIクライアントの初期化に失敗しました。")
         try:
-            self.init_chat_model()
+            self._pooled("chat", self._build_chat_model)
         except Exception:
             raise InvalidAPIError("チャットモデルの初期化に失敗しました。")
         try:
-            self.init_embd_model()
+            self._pooled("embd", self._build_embd_model)
         except Exception:
             raise InvalidAPIError("埋め込みモデルの初期化に失敗しました。")
         # NOTE: Unlike OpenAI, there seems to be no `models` API in Azure OpenAI.
@@ -158,17 +432,60 @@ class AzureOpenAIAPIConfig:
         #   https://learn.microsoft.com/en-us/answers/questions/1472308/how-to-validate-azure-open-ai-configuration-triple
         #   The problem is, even if we succeeded in instantiating `AzureOpenAIAPIConfig`,
         #   we cannot be sure that the API info is valid.
+        validation_cache.add(validation_key)
+        self._validated = True
 
     def init_openai_client(self) -> openai.AzureOpenAI:
+        self._ensure_validated()
+        return self._pooled("client", self._build_openai_client)
+
+    def init_chat_model(self) -> AzureChatOpenAI:
+        self._ensure_validated()
+        return self._pooled("chat", self._build_chat_model)
+
+    def init_embd_model(self) -> AzureOpenAIEmbeddings:
+        self._ensure_validated()
+        return self._pooled("embd", self._build_embd_model)
+
+    def init_async_openai_client(self) -> openai.AsyncAzureOpenAI:
+        self._ensure_validated()
+        return self._pooled_async("client", self._build_async_openai_client)
+
+    def init_async_chat_model(self) -> AzureChatOpenAI:
+        self._ensure_validated()
+        # NOTE: AzureChatOpenAIは自身で非同期クライアントを作るので、ループごとに作る
+        return self._pooled_async("chat", self._build_chat_model)
+
+    def _ensure_validated(self) -> None:
+        if not self._validated:
+            self.validate()
+
+    def _pooled(self, kind: str, factory: Callable[[], Any]) -> Any:
+        return client_pool.get((self.fingerprint(), kind), factory)
+
+    def _pooled_async(self, kind: str, factory: Callable[[], Any]) -> Any:
+        return client_pool.get_async((self.fingerprint(), kind), factory)
+
+    def _build_openai_client(self) -> openai.AzureOpenAI:
         assert self.azure_openai_endpoint is not None  # for mypy
         return openai.AzureOpenAI(
             azure_ad_token=self.azure_openai_ad_token,
             api_key=self.azure_openai_api_key,
             azure_endpoint=self.azure_openai_endpoint,
             api_version=self.openai_api_version,
+            http_client=client_pool.http_client,
         )
 
-    def init_chat_model(self) -> AzureChatOpenAI:
+    def _build_async_openai_client(self) -> openai.AsyncAzureOpenAI:
+        assert self.azure_openai_endpoint is not None  # for mypy
+        return openai.AsyncAzureOpenAI(
+            azure_ad_token=self.azure_openai_ad_token,
+            api_key=self.azure_openai_api_key,
+            azure_endpoint=self.azure_openai_endpoint,
+            api_version=self.openai_api_version,
+        )
+
+    def _build_chat_model(self) -> AzureChatOpenAI:
         assert self.openai_api_version is not None
         return AzureChatOpenAI(
             azure_ad_token=self.azure_openai_ad_token,  # type: ignore[arg-type]
@@ -178,6 +495,7 @@ class AzureOpenAIAPIConfig:
             azure_deployment=self.chat_model_name,
             temperature=self.temperature,
             max_tokens=self.max_tokens,
+            # NOTE: http_clientを渡すと非同期クライアントにも渡され、型エラーになる
         )
         # NOTE: Due to a bug in langchain-openai, the following code does not work.
         #   More precisely, the `client` parameter is ignored.
@@ -190,13 +508,14 @@ class AzureOpenAIAPIConfig:
         #     max_tokens=self.max_tokens,
         # )
 
-    def init_embd_model(self) -> AzureOpenAIEmbeddings:
+    def _build_embd_model(self) -> AzureOpenAIEmbeddings:
         return AzureOpenAIEmbeddings(
             azure_ad_token=self.azure_openai_ad_token,  # type: ignore[arg-type]
             api_key=self.azure_openai_api_key,  # type: ignore[arg-type]
             azure_endpoint=self.azure_openai_endpoint,
             api_version=self.openai_api_version,
             azure_deployment=self.embd_model_name,
+            # NOTE: http_clientを渡すと非同期クライアントにも渡され、型エラーになる
         )
         # NOTE: Due to a bug in langchain-openai, the following code does not work.
         #   More precisely, the `client` parameter is ignored.
@@ -239,6 +558,12 @@ class API:
     def init_embd_model(self) -> OpenAIEmbeddings | AzureOpenAIEmbeddings:
         return self.config.init_embd_model()
 
+    def init_async_openai_client(self) -> openai.AsyncOpenAI | openai.AsyncAzureOpenAI:
+        return self.config.init_async_openai_client()
+
+    def init_async_chat_model(self) -> ChatOpenAI | AzureChatOpenAI:
+        return self.config.init_async_chat_model()
+
 
 def has_valid_openai_api_from_env():
     try:
@@ -0,0 +1,17 @@
+"""Token counting shared by the prompt builder and the embedding pipeline."""
+
+import functools
+
+import tiktoken
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model_name: str, fallback: str = "cl100k_base") -> tiktoken.Encoding:
+    """Returns the tiktoken encoding of the model.
+
+    Falls back to the encoding `fallback` if tiktoken does not know the model.
+    """
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding(fallback)
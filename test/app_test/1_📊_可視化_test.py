@@ -1,5 +1,7 @@
 from streamlit.testing.v1 import AppTest
 
+from app_util import cache
+
 # Relative to the present test module
 APP_PATH = "../../app/pages/1_📊_可視化.py"
 
@@ -109,3 +111,52 @@ def test_reupload():
     assert at.main[1].proto.expandable.expanded is False
     assert at.main[2].proto.expandable.label == "関連データ"
     assert at.main[2].proto.expandable.expanded is True
+
+
+def test_select_without_query(monkeypatch):
+    """Tests whether changing the chart selector reuses the cached comparison."""
+    num_builds = 0
+    build_comparison = cache.build_comparison
+
+    def counting_build_comparison(json_obj):
+        nonlocal num_builds
+        num_builds += 1
+        return build_comparison(json_obj)
+
+    monkeypatch.setattr(cache, "build_comparison", counting_build_comparison)
+    cache._comparison.clear()
+    at = AppTest.from_file(APP_PATH).run()
+    at.session_state["json_obj"] = {
+        "フェーズ": "要件定義",
+        "システム": "システム１",
+        "算出方法": "合計値",
+        "分類": "全体",
+        "プロダクト指標(外形)_ページ数_(頁)": 3355.0,
+        "プロダクト指標(外形)_文字数_(文字)": 1000000.0,
+    }
+    at.session_state["data_file_name"] = "data.json"
+    at.session_state["data_file_size"] = 1234
+    at.run()
+    at.selectbox[0].select("プロダクト指標(外形)_文字数_(文字)").run()
+    assert not at.exception
+    assert num_builds == 1
+
+
+def test_vega_chart():
+    """Tests whether the chart can be drawn by the browser instead."""
+    at = AppTest.from_file(APP_PATH).run()
+    at.session_state["json_obj"] = {
+        "フェーズ": "要件定義",
+        "システム": "システム１",
+        "算出方法": "合計値",
+        "分類": "全体",
+        "プロダクト指標(外形)_ページ数_(頁)": 3355.0,
+    }
+    at.session_state["data_file_name"] = "data.json"
+    at.session_state["data_file_size"] = 1234
+    at.run()
+    assert len(at.toggle) == 1
+    assert at.toggle[0].value is False
+    at.toggle[0].set_value(True).run()
+    assert not at.exception
+    assert len(at.get("arrow_vega_lite_chart")) == 1
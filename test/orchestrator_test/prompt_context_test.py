@@ -0,0 +1,55 @@
+"""Tests for the prompt_context module."""
+
+import json
+
+import pandas as pd
+import pytest
+
+from orchestrator.prompt_context import (
+    build_past_data,
+    build_prompt_context,
+    count_tokens,
+    serialize_past_data,
+    similarity_order,
+)
+from orchestrator.review import get_pre_info
+from rag_tabular.excel_to_csv import get_rag_tab_path
+from util.catvar import DevPhase
+
+MODEL_NAME = "gpt-4o"
+
+
+def test_similarity_order():
+    series = pd.Series({"システム": "A", "x": 1.0, "y": 10.0})
+    df = pd.DataFrame(
+        {
+            "システム": ["B", "C", "D", "E"],
+            "x": [5.0, 1.0, 2.0, None],
+            "y": [50.0, 11.0, None, None],
+        }
+    )
+    assert df["システム"].iloc[similarity_order(series, df)].tolist() == [
+        "C",
+        "D",
+        "B",
+        "E",
+    ]
+
+
+@pytest.mark.parametrize("phase", DevPhase)
+def test_build_past_data(phase: DevPhase):
+    """Tests whether the past data is cut to the most similar systems."""
+    json_dir = get_rag_tab_path().parent.joinpath(f"json/{phase.ja}")
+    with open(json_dir.joinpath(f"{phase.ja}_00.json"), encoding="utf-8") as f:
+        json_obj = json.load(f)
+    series, df, _ = get_pre_info(json_obj)
+    text, n = build_past_data(series, df, MODEL_NAME, token_budget=10**6)
+    assert n == len(df)
+    assert text == serialize_past_data(df.iloc[similarity_order(series, df)])
+    token_budget = count_tokens(text, MODEL_NAME) - 1
+    text, n = build_past_data(series, df, MODEL_NAME, token_budget=token_budget)
+    assert n < len(df)
+    assert n == 1 or count_tokens(text, MODEL_NAME) <= token_budget
+    context = build_prompt_context(series, df, MODEL_NAME, token_budget=token_budget)
+    assert context["past_data"].startswith(f"(類似する{n}件/全{len(df)}件)")
+    assert series["システム"] in context["data"]
@@ -0,0 +1,78 @@
+"""Tests for the review_stats module."""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from orchestrator.review import get_pre_info, get_reference
+from orchestrator.review_stats import (
+    REFERENCE_METRICS,
+    compare_with_past,
+    compare_with_reference,
+    format_review_statistics,
+    parse_reference_tables,
+)
+from rag_tabular.excel_to_csv import get_rag_tab_path
+from util.catvar import DevPhase
+
+
+def test_compare_with_past():
+    series = pd.Series({"システム": "A", "算出方法": "合計値", "x": 3.0, "y": 1.0})
+    df = pd.DataFrame(
+        {
+            "システム": ["B", "C", "D"],
+            "算出方法": ["合計値"] * 3,
+            "x": [1.0, 2.0, 4.0],
+            "y": [None, None, None],
+        }
+    )
+    stats = compare_with_past(series, df)
+    assert stats.index.tolist() == ["x", "y"]
+    x = stats.loc["x"]
+    assert x["件数"] == 3
+    assert x["平均"] == pytest.approx(7 / 3)
+    assert x["中央値"] == 2.0
+    assert x["平均との差"] == pytest.approx(3.0 - 7 / 3)
+    assert x["z"] == pytest.approx((3.0 - 7 / 3) / df["x"].std())
+    assert x["百分位"] == pytest.approx(2 / 3)
+    y = stats.loc["y"]
+    assert y["件数"] == 0
+    assert np.isnan(y[["平均", "z", "百分位"]].astype(float)).all()
+
+
+@pytest.mark.parametrize("phase", DevPhase)
+def test_parse_reference_tables(phase: DevPhase):
+    reference = get_reference(pd.Series({"フェーズ": phase.ja}))
+    tables = parse_reference_tables(reference)
+    figures = {figure for figure, _ in REFERENCE_METRICS[phase].values()}
+    assert figures <= tables.keys()
+    for _, row in REFERENCE_METRICS[phase].values():
+        if row is not None:
+            assert row in tables["図表 7-5-27"].index
+    if "図表 7-5-27" in tables:
+        assert (
+            tables["図表 7-5-27"].loc["結合テスト（テストケース）", "最大"] == 1332.77
+        )
+
+
+@pytest.mark.parametrize("phase", DevPhase)
+def test_review_statistics(phase: DevPhase):
+    """Tests the comparisons of the current data of each phase."""
+    json_dir = get_rag_tab_path().parent.joinpath(f"json/{phase.ja}")
+    with open(json_dir.joinpath(f"{phase.ja}.schema.json"), encoding="utf-8") as f:
+        properties = json.load(f)["properties"]
+    assert REFERENCE_METRICS[phase].keys() <= properties.keys()
+    with open(json_dir.joinpath(f"{phase.ja}_00.json"), encoding="utf-8") as f:
+        json_obj = json.load(f)
+    series, df, reference_information = get_pre_info(json_obj)
+    reference_stats = compare_with_reference(series, reference_information)
+    for metric, stats in reference_stats.iterrows():
+        if pd.isna(stats["値"]):
+            continue
+        assert stats["中央との差"] == pytest.approx(series[metric] - stats["中央"])
+        assert 0 <= stats["百分位"] <= 1
+    text = format_review_statistics(series, df, reference_information)
+    assert text.startswith("過去のデータとの比較")
+    assert ("参照項目との比較" in text) == (not reference_stats.empty)
@@ -1,12 +1,86 @@
 """Tests for the review module."""
 
+import asyncio
 import json
+import os
+import shutil
 
+import pandas as pd
 import pytest
 
-from orchestrator.review import generate_review, review_agent
+from orchestrator.review import (
+    REFERENCE_DIR,
+    ReferenceRegistry,
+    agenerate_review,
+    areview_agent,
+    build_comparison,
+    build_review_prompt,
+    generate_review,
+    get_pre_info,
+    get_reference,
+    review_agent,
+)
 from rag_tabular.excel_to_csv import get_rag_tab_path
 from util.api import API, APIType, has_valid_openai_api_from_env
+from util.catvar import DevPhase
+
+
+@pytest.mark.parametrize("phase", DevPhase)
+def test_build_comparison(phase: DevPhase):
+    """Tests whether the comparison agrees with `get_pre_info`."""
+    json_dir = get_rag_tab_path().parent.joinpath(f"json/{phase.ja}")
+    json_path = json_dir.joinpath(f"{phase.ja}_00.json")
+    with open(json_path, "r", encoding="utf-8") as f:
+        json_obj = json.load(f)
+    comparison = build_comparison(json_obj)
+    assert json_obj["システム"] in comparison.df.columns
+    assert "算出方法" not in comparison.df.index
+    series, df, reference_information = get_pre_info(json_obj)
+    expected_series, expected_df, expected_reference_information = comparison.pre_info()
+    assert series.equals(expected_series)
+    assert df.equals(expected_df)
+    assert reference_information == expected_reference_information
+
+
+@pytest.mark.parametrize("phase", DevPhase)
+def test_get_reference(phase: DevPhase):
+    """Tests whether the reference information is loaded once and read-only."""
+    series = pd.Series({"フェーズ": phase.ja})
+    reference = get_reference(series)
+    assert get_reference(series) is reference
+    file_path = REFERENCE_DIR.joinpath(f"{phase.ja}_参照項目.json")
+    with open(file_path, "r", encoding="utf-8") as f:
+        expected_reference = json.load(f)
+    assert reference == expected_reference
+    assert str(reference) == str(expected_reference)
+    with pytest.raises(TypeError):
+        reference.append({})
+
+
+def test_reference_registry_reload(tmp_path):
+    """Tests whether a modified reference file is reloaded."""
+    reference_dir = tmp_path.joinpath("参照項目")
+    shutil.copytree(REFERENCE_DIR, reference_dir)
+    registry = ReferenceRegistry(reference_dir)
+    registry.preload()
+    reference = registry.get(DevPhase.RD)
+    file_path = registry.file_path(DevPhase.RD)
+    file_path.write_text(json.dumps([{"page_content": "更新"}]), encoding="utf-8")
+    stat = file_path.stat()
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert registry.get(DevPhase.RD) is not reference
+    assert registry.get(DevPhase.RD) == [{"page_content": "更新"}]
+
+
+def test_build_review_prompt():
+    """Tests whether the messages agree with the transcript of the prompt."""
+    json_path = get_rag_tab_path().parent.joinpath("json/基本設計/基本設計_00.json")
+    with open(json_path, "r", encoding="utf-8") as f:
+        json_obj = json.load(f)
+    prompt_value = build_review_prompt(json_obj, "観点", "gpt-4o")
+    (message,) = prompt_value.to_messages()
+    assert prompt_value.to_string() == f"Human: {message.content}"
+    assert "<計算結果>過去のデータとの比較" in message.content
 
 
 @pytest.mark.skipif(
@@ -45,6 +119,50 @@ def test_review_agent():
     assert isinstance(response_text, str)
 
 
+@pytest.mark.skipif(
+    not has_valid_openai_api_from_env(), reason="OpenAI API key not found"
+)
+def test_agenerate_review():
+    api = API.from_env(APIType.OPENAI)
+    json_path = get_rag_tab_path().parent.joinpath("json/基本設計/基本設計_00.json")
+    with open(json_path, "r", encoding="utf-8") as f:
+        json_obj = json.load(f)
+    analysisPoint = "時間がないので、必ず50文字以内で簡潔にレビューを行なってください。"
+
+    async def review() -> tuple[str, str]:
+        response, prompt_content = await agenerate_review(json_obj, analysisPoint, api)
+        response_text = ""
+        async for chunk in response:
+            if chunk is not None:
+                response_text += chunk
+        return response_text, prompt_content
+
+    response_text, prompt_content = asyncio.run(review())
+    assert isinstance(response_text, str)
+    assert isinstance(prompt_content, str)
+
+
+@pytest.mark.skipif(
+    not has_valid_openai_api_from_env(), reason="OpenAI API key not found"
+)
+def test_areview_agent():
+    api = API.from_env(APIType.OPENAI)
+
+    async def chat(content: str) -> str:
+        messages = [{"role": "user", "content": content}]
+        response_text = ""
+        async for chunk in areview_agent(messages, api):
+            if chunk.choices[0].delta.content is not None:
+                response_text += chunk.choices[0].delta.content
+        return response_text
+
+    async def chat_concurrently() -> list[str]:
+        return await asyncio.gather(chat("こんにちは"), chat("ありがとう"))
+
+    for response_text in asyncio.run(chat_concurrently()):
+        assert isinstance(response_text, str)
+
+
 @pytest.mark.skipif(
     not has_valid_openai_api_from_env(), reason="OpenAI API key not found"
 )
@@ -0,0 +1,28 @@
+"""Fixtures shared by the tests for the rag_tabular package."""
+
+import sqlite3
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from util.catvar import DevPhase
+
+
+def _assert_same_rows(db_path: Path, expected_db_path: Path) -> None:
+    """Asserts that the "systems" and phase tables of the databases agree."""
+    with sqlite3.connect(expected_db_path) as expected_conn:
+        with sqlite3.connect(db_path) as conn:
+            for table in ["systems"] + [phase.name for phase in DevPhase]:
+                stmt = f"SELECT * FROM {table} ORDER BY 1, 2, 3"
+                if table == "systems":
+                    stmt = "SELECT * FROM systems ORDER BY 1"
+                assert (
+                    conn.execute(stmt).fetchall()
+                    == expected_conn.execute(stmt).fetchall()
+                ), table
+
+
+@pytest.fixture
+def assert_same_rows() -> Callable[[Path, Path], None]:
+    return _assert_same_rows
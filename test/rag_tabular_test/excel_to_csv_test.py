@@ -6,7 +6,12 @@ from pathlib import Path
 import pandas as pd
 import pytest
 
-from rag_tabular.excel_to_csv import excel_to_csv, get_rag_tab_path
+from rag_tabular.excel_to_csv import (
+    excel_to_csv,
+    get_rag_tab_path,
+    read_excel,
+    read_excel_sheets,
+)
 from util.catvar import DevPhase
 
 
@@ -21,6 +26,16 @@ def test_excel_and_csv(phase):
     assert current_csv_df.equals(expected_csv_df)
 
 
+@pytest.mark.parametrize("max_workers", [None, 2])
+def test_read_excel_sheets(max_workers):
+    """Tests whether reading all the sheets at once gives the same DataFrames."""
+    rag_tab_path: Path = get_rag_tab_path()
+    dfs = read_excel_sheets(rag_tab_path, max_workers=max_workers)
+    assert list(dfs) == list(DevPhase)
+    for phase, df in dfs.items():
+        assert df.equals(read_excel(rag_tab_path, phase))
+
+
 @pytest.mark.parametrize("phase", DevPhase)
 def test_column_names_of_csv(phase):
     """Tests whether the column names of the CSV file are as expected."""
@@ -0,0 +1,55 @@
+"""Tests for the excel_to_db module."""
+
+import json
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from rag_tabular.excel_to_csv import get_rag_tab_path
+from rag_tabular.excel_to_db import excel_to_db
+from rag_tabular.summary import define_summary_tables
+from util.catvar import DevPhase
+
+
+@pytest.fixture(scope="module")
+def db_dir(tmp_path_factory) -> Path:
+    db_dir = tmp_path_factory.mktemp("excel_to_db")
+    excel_to_db(
+        get_rag_tab_path(),
+        db_path=db_dir.joinpath("tables.sqlite3"),
+        json_dir=db_dir.joinpath("json"),
+    )
+    return db_dir
+
+
+def test_excel_to_db(db_dir: Path, assert_same_rows):
+    """Tests whether the direct pipeline reproduces the current database."""
+    rag_tab_path = get_rag_tab_path()
+    with sqlite3.connect(rag_tab_path.with_suffix(".sqlite3")) as expected_conn:
+        with sqlite3.connect(db_dir.joinpath("tables.sqlite3")) as conn:
+            # NOTE: 集計テーブルとハッシュのテーブルも含めて、同じスキーマであること
+            stmt = "SELECT name, sql FROM sqlite_master ORDER BY name"
+            assert (
+                conn.execute(stmt).fetchall() == expected_conn.execute(stmt).fetchall()
+            )
+            for table in define_summary_tables().tables:
+                stmt = f"SELECT * FROM {table} ORDER BY 1, 2, 3, 4, 5"
+                assert (
+                    conn.execute(stmt).fetchall()
+                    == expected_conn.execute(stmt).fetchall()
+                ), table
+    assert_same_rows(
+        db_dir.joinpath("tables.sqlite3"), rag_tab_path.with_suffix(".sqlite3")
+    )
+
+
+@pytest.mark.parametrize("phase", DevPhase)
+def test_json_schema(db_dir: Path, phase: DevPhase):
+    """Tests whether the direct pipeline saves the current JSON schemata."""
+    json_dir = get_rag_tab_path().parent.joinpath("json")
+    json_schema_path = Path(f"{phase.ja}/{phase.ja}.schema.json")
+    with open(json_dir.joinpath(json_schema_path), "r", encoding="utf-8") as f:
+        expected_json_schema_obj = json.load(f)
+    with open(db_dir.joinpath("json", json_schema_path), "r", encoding="utf-8") as f:
+        assert json.load(f) == expected_json_schema_obj
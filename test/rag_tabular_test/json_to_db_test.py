@@ -1,11 +1,25 @@
 """Tests for the json_to_db module."""
 
 import json
+import os
+import shutil
+import sqlite3
 
 import pytest
+from jsonschema import ValidationError
 
 from rag_tabular.excel_to_csv import get_rag_tab_path
-from rag_tabular.json_to_db import query_sql_db
+from rag_tabular.json_to_db import (
+    define_db,
+    get_tabular_store,
+    get_validator,
+    load_json_instances,
+    load_json_schemata,
+    manipulate_db,
+    query_sql_db,
+    sync_db,
+    validate_json_instances,
+)
 from util.catvar import DevPhase
 
 
@@ -38,3 +52,82 @@ def test_query(phase: DevPhase):
         series, df = query_sql_db(json_obj)
         # assert that the series is "contained" in the dataframe
         assert (df == series).all(axis=1).sum() == 1
+
+
+def test_tabular_store():
+    rag_tab_path = get_rag_tab_path()
+    db_path = rag_tab_path.with_suffix(".sqlite3")
+    json_dir = rag_tab_path.parent.joinpath("json")
+    store = get_tabular_store(db_path, json_dir)
+    assert get_tabular_store(db_path, json_dir) is store
+    with open(json_dir.joinpath("要件定義/要件定義_00.json"), encoding="utf-8") as f:
+        json_obj = json.load(f)
+    df = store.query(json_obj)
+    assert store.query({**json_obj, "システム": "別のシステム"}).equals(df)
+    # NOTE: 同じ形のクエリではステートメントが再利用される
+    columns = tuple(key for key in json_obj if key != "フェーズ")
+    stmt = store.statement(DevPhase.RD, columns, by_classification=True)
+    assert store.statement(DevPhase.RD, columns, by_classification=True) is stmt
+
+
+def test_define_and_manipulate_db(tmp_path, assert_same_rows):
+    """Tests whether rebuilding the database reproduces the current one."""
+    rag_tab_path = get_rag_tab_path()
+    db_path = tmp_path.joinpath("tables.sqlite3")
+    define_db(rag_tab_path, db_path=db_path)
+    manipulate_db(rag_tab_path, db_path=db_path)
+    assert_same_rows(db_path, rag_tab_path.with_suffix(".sqlite3"))
+
+
+def test_sync_db(tmp_path, assert_same_rows):
+    """Tests whether only the changed rows are written in place."""
+    json_dir = get_rag_tab_path().parent.joinpath("json")
+    json_schema_objs = load_json_schemata(json_dir)
+    rows = load_json_instances(json_dir)
+    db_path = tmp_path.joinpath("tables.sqlite3")
+    sync_db(db_path, json_schema_objs, rows)
+    inode = db_path.stat().st_ino
+    # modify the first row and delete the last row of a phase
+    rows[DevPhase.RD] = [dict(row) for row in rows[DevPhase.RD][:-1]]
+    modified_row = rows[DevPhase.RD][0]
+    metric = next(
+        key
+        for key, value in modified_row.items()
+        if value is not None and not isinstance(value, str)
+    )
+    modified_row[metric] += 1.0
+    sync_db(db_path, json_schema_objs, rows)
+    assert db_path.stat().st_ino == inode
+    with sqlite3.connect(db_path) as conn:
+        stmt = f"SELECT COUNT(*) FROM {DevPhase.RD.name}"
+        assert conn.execute(stmt).fetchone() == (len(rows[DevPhase.RD]),)
+        stmt = (
+            f'SELECT "{metric}" FROM {DevPhase.RD.name} '
+            "WHERE システム = ? AND 算出方法 = ? AND 分類 = ?"
+        )
+        params = [modified_row[key] for key in ("システム", "算出方法", "分類")]
+        assert conn.execute(stmt, params).fetchone() == (modified_row[metric],)
+    # a full rebuild gives the same rows
+    rebuilt_db_path = tmp_path.joinpath("rebuilt.sqlite3")
+    sync_db(rebuilt_db_path, json_schema_objs, rows, full_rebuild=True)
+    assert_same_rows(db_path, rebuilt_db_path)
+
+
+def test_validator(tmp_path):
+    """Tests whether the validators are cached until the schema is modified."""
+    json_dir = tmp_path.joinpath("json")
+    shutil.copytree(get_rag_tab_path().parent.joinpath("json"), json_dir)
+    phase = DevPhase.RD
+    validator = get_validator(json_dir, phase.ja)
+    assert get_validator(json_dir, phase.ja) is validator
+    json_objs = [
+        json.loads(json_path.read_text(encoding="utf-8"))
+        for json_path in sorted(json_dir.joinpath(phase.ja).glob(f"{phase.ja}_*.json"))
+    ]
+    validate_json_instances(json_objs, json_dir)
+    with pytest.raises(ValidationError):
+        validate_json_instances(json_objs + [{"フェーズ": phase.ja}], json_dir)
+    json_schema_path = json_dir.joinpath(f"{phase.ja}/{phase.ja}.schema.json")
+    stat = json_schema_path.stat()
+    os.utime(json_schema_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert get_validator(json_dir, phase.ja) is not validator
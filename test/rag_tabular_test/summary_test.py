@@ -0,0 +1,59 @@
+"""Tests for the summary module."""
+
+import pandas as pd
+import pytest
+
+from rag_tabular.excel_to_csv import get_rag_tab_path
+from rag_tabular.json_to_db import (
+    load_json_instances,
+    load_json_schemata,
+    query_metric_summary,
+    query_sql_db,
+    sync_db,
+)
+from rag_tabular.summary import summarize
+from util.catvar import DevPhase
+
+
+def test_summarize():
+    df = pd.DataFrame(
+        {
+            "システム": ["A", "B", "C", "D"],
+            "算出方法": ["合計値", "合計値", "合計値", "平均値"],
+            "指標": [3.0, 1.0, None, 5.0],
+        }
+    )
+    summaries, ranks = summarize(df, DevPhase.ST)
+    assert [
+        (summary["calc_method"], summary["count"], summary["median"])
+        for summary in summaries
+    ] == [("合計値", 2, 2.0), ("平均値", 1, 5.0)]
+    assert summaries[0]["sorted_values"] == "[1.0, 3.0]"
+    assert summaries[0]["classification"] is None
+    assert [(rank["system"], rank["percentile_rank"]) for rank in ranks] == [
+        ("A", 1.0),
+        ("B", 0.5),
+        ("D", 1.0),
+    ]
+
+
+@pytest.mark.parametrize("phase", DevPhase)
+def test_query_metric_summary(tmp_path, phase: DevPhase):
+    """Tests whether the lookup agrees with the rows of the database."""
+    json_dir = get_rag_tab_path().parent.joinpath("json")
+    db_path = tmp_path.joinpath("tables.sqlite3")
+    sync_db(db_path, load_json_schemata(json_dir), load_json_instances(json_dir))
+    json_obj = {"フェーズ": phase.ja, **load_json_instances(json_dir)[phase][0]}
+    summary = query_metric_summary(json_obj, db_path=db_path)
+    _, df = query_sql_db(json_obj, db_path=db_path)
+    for metric, value in json_obj.items():
+        if metric not in summary.index:
+            continue
+        values = df[metric].dropna()
+        assert summary.loc[metric, "件数"] == len(values)
+        assert summary.loc[metric, "中央値"] == pytest.approx(values.median())
+        assert summary.loc[metric, "百分位"] == pytest.approx((values <= value).mean())
+    # a value not in the database is located among the sorted values
+    metric = summary.index[0]
+    json_obj = {**json_obj, "システム": "新規システム", metric: float("inf")}
+    assert query_metric_summary(json_obj, db_path=db_path).loc[metric, "百分位"] == 1.0
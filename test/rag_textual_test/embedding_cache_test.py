@@ -0,0 +1,77 @@
+"""Tests for the embedding_cache module."""
+
+from langchain_community.embeddings import FakeEmbeddings
+
+from rag_textual.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+MODEL = "text-embedding-3-small"
+
+
+class _CountingEmbeddings(FakeEmbeddings):
+    """Counts the number of queries and documents actually embedded."""
+
+    num_queries: int = 0
+    num_documents: int = 0
+
+    def embed_query(self, text: str) -> list[float]:
+        self.num_queries += 1
+        return super().embed_query(text)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.num_documents += len(texts)
+        return super().embed_documents(texts)
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    db_path = tmp_path.joinpath("embeddings.sqlite3")
+    cache = EmbeddingCache(db_path, maxsize=1)
+    assert cache.is_persistent
+    assert cache.get(MODEL, "foo") is None
+    cache.put(MODEL, "foo", [0.5, 0.25])
+    assert cache.get(MODEL, "foo") == [0.5, 0.25]
+    assert cache.get("another-model", "foo") is None
+    cache.put(MODEL, "bar", [1.0, 2.0])  # NOTE: "foo"はメモリから追い出される
+    assert cache.get(MODEL, "foo") == [0.5, 0.25]
+    assert cache.stats.as_dict() == {
+        "memory_hits": 1,
+        "disk_hits": 1,
+        "misses": 2,
+        "hits": 2,
+        "hit_rate": 0.5,
+    }
+    cache.close()
+
+    # NOTE: 別のインスタンスからもディスク上のベクトルを参照できる
+    reopened_cache = EmbeddingCache(db_path)
+    assert reopened_cache.get_many(MODEL, ["foo", "bar", "baz"]) == [
+        [0.5, 0.25],
+        [1.0, 2.0],
+        None,
+    ]
+    reopened_cache.close()
+
+
+def test_cached_embeddings():
+    embeddings = _CountingEmbeddings(size=8)
+    cached_embeddings = CachedEmbeddings(embeddings, MODEL, EmbeddingCache())
+    vector = cached_embeddings.embed_query("基本設計の レビュー工数")
+    # NOTE: 全角・半角や空白の違いは正規化される
+    assert cached_embeddings.embed_query("  基本設計の　レビュー工数") == vector
+    assert embeddings.num_queries == 1
+    assert cached_embeddings.cache.stats.hits == 1
+
+
+def test_cached_embed_documents(tmp_path):
+    """Tests whether only the texts not in the cache are embedded."""
+    embeddings = _CountingEmbeddings(size=8)
+    cache = EmbeddingCache(tmp_path.joinpath("embeddings.sqlite3"))
+    cached_embeddings = CachedEmbeddings(embeddings, MODEL, cache)
+    vectors = cached_embeddings.embed_documents(["foo", "bar"])
+    assert embeddings.num_documents == 2
+    assert cached_embeddings.embed_documents(["bar", "baz", "foo"]) == [
+        vectors[1],
+        cache.get(MODEL, "baz"),
+        vectors[0],
+    ]
+    assert embeddings.num_documents == 3
+    cache.close()
@@ -0,0 +1,126 @@
+"""Tests for the embedding_pipeline module, against a local fake embeddings server."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from langchain_openai import OpenAIEmbeddings
+
+from rag_textual.embedding_pipeline import EmbeddingPipeline, TokenBucket
+from util.tokenizer import get_encoding
+
+MODEL = "text-embedding-3-small"
+
+
+def _num_tokens(text: str | list[int]) -> float:
+    """The fake embedding: the number of tokens, given as text or as tokens."""
+    if isinstance(text, list):
+        return float(len(text))
+    return float(len(get_encoding(MODEL).encode(text)))
+
+
+class _FakeEmbeddingsHandler(BaseHTTPRequestHandler):
+    """Answers `POST /v1/embeddings` like OpenAI, rate-limiting some requests."""
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:  # type: ignore[attr-defined]
+            server.num_requests += 1  # type: ignore[attr-defined]
+            rate_limited = server.num_rate_limited > 0  # type: ignore[attr-defined]
+            if rate_limited:
+                server.num_rate_limited -= 1  # type: ignore[attr-defined]
+        if rate_limited:
+            payload = {"error": {"message": "Rate limit reached", "type": "requests"}}
+            self._respond(429, payload, {"retry-after": "0"})
+            return
+        data = [
+            {"object": "embedding", "index": index, "embedding": [_num_tokens(text)]}
+            for index, text in enumerate(body["input"])
+        ]
+        usage = {"prompt_tokens": 0, "total_tokens": 0}
+        payload = {"object": "list", "data": data, "model": MODEL, "usage": usage}
+        self._respond(200, payload)
+
+    def _respond(self, status: int, payload: dict, headers: dict | None = None):
+        content = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def fake_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeEmbeddingsHandler)
+    server.lock = threading.Lock()  # type: ignore[attr-defined]
+    server.num_requests = 0  # type: ignore[attr-defined]
+    server.num_rate_limited = 0  # type: ignore[attr-defined]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _embeddings(server) -> OpenAIEmbeddings:
+    return OpenAIEmbeddings(
+        model=MODEL,
+        api_key="sk-fake",  # type: ignore[arg-type]
+        base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+        max_retries=0,  # NOTE: 再試行はパイプラインに任せる
+    )
+
+
+def test_embedding_pipeline(fake_server):
+    texts = [f"チャンク{i}" * (i % 5 + 1) for i in range(25)]
+    pipeline = EmbeddingPipeline(
+        _embeddings(fake_server), MODEL, batch_size=4, max_workers=3, verbose=False
+    )
+    assert pipeline.embed_documents(texts) == [[_num_tokens(text)] for text in texts]
+    assert fake_server.num_requests == 7
+    assert pipeline.num_retries == 0
+
+
+def test_embedding_pipeline_retry(fake_server, monkeypatch):
+    fake_server.num_rate_limited = 3
+    texts = [f"チャンク{i}" for i in range(8)]
+    pipeline = EmbeddingPipeline(
+        _embeddings(fake_server),
+        MODEL,
+        batch_size=2,
+        max_workers=2,
+        backoff_base=0.01,
+        verbose=False,
+    )
+    acquired: list[int] = []
+    acquire = pipeline.bucket.acquire
+
+    def counting_acquire(tokens: int) -> float:
+        acquired.append(tokens)
+        return acquire(tokens)
+
+    monkeypatch.setattr(pipeline.bucket, "acquire", counting_acquire)
+    assert pipeline.embed_documents(texts) == [[_num_tokens(text)] for text in texts]
+    assert pipeline.num_retries == 3
+    assert fake_server.num_requests == 4 + 3
+    # NOTE: 再試行も含め、リクエストごとにトークンを取る
+    assert len(acquired) == fake_server.num_requests
+
+    fake_server.num_rate_limited = 10
+    pipeline.max_retries = 1
+    with pytest.raises(Exception, match="Rate limit"):
+        pipeline.embed_documents(texts)
+
+
+def test_token_bucket():
+    bucket = TokenBucket(tokens_per_minute=600)  # NOTE: 10トークン/秒
+    assert bucket.acquire(600) == 0.0
+    assert bucket.acquire(1) == pytest.approx(0.1, abs=0.05)
@@ -1,17 +1,80 @@
 """Tests for the retrieve_from_db module."""
 
 import json
+import os
 
 import pytest
+from langchain_community.embeddings import FakeEmbeddings
 from langchain_community.vectorstores.chroma import Chroma
 
-from rag_textual.retrieve_from_db import load_db, retrieve_documents
+from rag_textual.retrieve_from_db import clear_db_registry, load_db, retrieve_documents
 from util.api import API, APIType, has_valid_openai_api_from_env
 
 QUERY = "IPA白書によると、基本設計レビュー実績工数の中央値はどのぐらいの値でしょうか?"
 K = 3
 
 
+class _FakeConfig:
+    embd_model_name = "fake"
+
+    def fingerprint(self) -> str:
+        return "fake"
+
+
+class _FakeAPI:
+    """Stands in for `API` without any network access."""
+
+    config = _FakeConfig()
+
+    def init_embd_model(self) -> FakeEmbeddings:
+        return FakeEmbeddings(size=8)
+
+
+def test_db_registry(tmp_path, monkeypatch):
+    monkeypatch.setenv(
+        "RAG_EMBD_CACHE_PATH", str(tmp_path.joinpath("embeddings.sqlite3"))
+    )
+    Chroma.from_texts(
+        ["ソフトウェア開発データ白書"],
+        FakeEmbeddings(size=8),
+        persist_directory=str(tmp_path),
+    )
+    clear_db_registry()
+    try:
+        api = _FakeAPI()
+        retriever = load_db(api, tmp_path)  # type: ignore[arg-type]
+        assert load_db(api, tmp_path) is retriever  # type: ignore[arg-type]
+        # NOTE: DBが更新されると再ロードされる
+        sqlite_path = tmp_path.joinpath("chroma.sqlite3")
+        mtime_ns = sqlite_path.stat().st_mtime_ns + 1_000_000_000
+        os.utime(sqlite_path, ns=(mtime_ns, mtime_ns))
+        reloaded_retriever = load_db(api, tmp_path)  # type: ignore[arg-type]
+        assert reloaded_retriever is not retriever
+        assert len(retrieve_documents(reloaded_retriever, query=QUERY, k=1)) == 1
+        assert tmp_path.joinpath("embeddings.sqlite3").exists()
+    finally:
+        clear_db_registry()
+
+
+def test_load_db_embedding_cache_path(tmp_path, monkeypatch):
+    """Tests whether the embedding cache is placed next to the given DB."""
+    for name in ["RAG_EMBD_CACHE_PATH", "RAG_TXT_DB_PATH", "RAG_TXT_PATH"]:
+        monkeypatch.delenv(name, raising=False)
+    persist_directory = tmp_path.joinpath("corpus_chroma_db")
+    Chroma.from_texts(
+        ["ソフトウェア開発データ白書"],
+        FakeEmbeddings(size=8),
+        persist_directory=str(persist_directory),
+    )
+    clear_db_registry()
+    try:
+        retriever = load_db(_FakeAPI(), persist_directory)  # type: ignore[arg-type]
+        assert len(retrieve_documents(retriever, query=QUERY, k=1)) == 1
+        assert tmp_path.joinpath("corpus_embeddings.sqlite3").exists()
+    finally:
+        clear_db_registry()
+
+
 @pytest.mark.skipif(
     not has_valid_openai_api_from_env(), reason="OpenAI API key not found"
 )
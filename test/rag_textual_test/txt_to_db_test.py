@@ -1,11 +1,23 @@
 """Tests for the txt_to_db module."""
 
+import multiprocessing
 from typing import List
 
+import pytest
+from langchain_community.embeddings import FakeEmbeddings
 from langchain_core.documents import Document
 from langchain_openai import OpenAIEmbeddings
+from langchain_text_splitters import CharacterTextSplitter
 
-from rag_textual.txt_to_db import TextProcessor, get_ipa_db_path, get_rag_txt_path
+from rag_textual.txt_to_db import (
+    TextProcessor,
+    chunk_id,
+    get_embedding_cache_path,
+    get_ipa_db_path,
+    get_rag_txt_path,
+    main,
+    resolve_sources,
+)
 
 
 def test_txt_to_db():
@@ -34,3 +46,171 @@ def test_txt_to_db():
     assert isinstance(
         embeddings, OpenAIEmbeddings
     ), "embeddingsがOpenAIEmbeddingsのインスタンスではありません"
+    assert embeddings.max_retries == 0, "再試行は埋め込みパイプラインに任せます"
+
+
+class _CountingEmbeddings(FakeEmbeddings):
+    """Counts the number of documents actually embedded."""
+
+    num_documents: int = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.num_documents += len(texts)
+        return super().embed_documents(texts)
+
+
+def test_store_documents(tmp_path):
+    """Tests whether a rebuild embeds only the new chunks."""
+    processor = TextProcessor(
+        embedding_model="text-embedding-3-small",
+        knowledge_path=str(tmp_path.joinpath("chroma_db")),
+    )
+    embeddings = _CountingEmbeddings(size=8)
+    docs = [Document(page_content=text) for text in ["foo", "bar", "foo"]]
+    retriever = processor.store_documents(docs, embeddings)
+    assert embeddings.num_documents == 2
+    assert sorted(retriever.vectorstore.get()["ids"]) == sorted(
+        chunk_id(doc) for doc in docs[:2]
+    )
+
+    docs = [Document(page_content=text) for text in ["bar", "baz"]]
+    retriever = processor.store_documents(docs, embeddings)
+    assert embeddings.num_documents == 3
+    assert sorted(retriever.vectorstore.get()["documents"]) == ["bar", "baz"]
+
+    processor.store_documents(docs, embeddings, full_rebuild=True)
+    assert embeddings.num_documents == 5
+
+
+def test_store_documents_with_embedding_cache(tmp_path):
+    """Tests whether another build reuses the cached embeddings."""
+    embeddings = _CountingEmbeddings(size=8)
+    docs = [Document(page_content=text) for text in ["foo", "bar"]]
+    for name in ["chroma_db_a", "chroma_db_b"]:
+        processor = TextProcessor(
+            embedding_model="text-embedding-3-small",
+            knowledge_path=str(tmp_path.joinpath(name)),
+            embedding_cache_path=tmp_path.joinpath("embeddings.sqlite3"),
+        )
+        processor.store_documents(docs, embeddings)
+    assert embeddings.num_documents == 2
+
+
+def test_merge_pages():
+    """Tests whether the pages are merged as `CharacterTextSplitter` does."""
+    processor = TextProcessor(
+        embedding_model="text-embedding-3-small", knowledge_path=""
+    )
+    pages = [f"page{i} " + "x" * (i * 37 % 300) for i in range(50)]
+    text_splitter = CharacterTextSplitter(
+        separator="\n\n", chunk_size=512, chunk_overlap=128
+    )
+    chunks = processor.merge_pages((page, i) for i, page in enumerate(pages))
+    assert [chunk for chunk, _ in chunks] == text_splitter.split_text(
+        "\n\n".join(pages)
+    )
+
+
+def _write_whitepaper(file_path, num_pages: int = 40) -> str:
+    """Writes a synthetic whitepaper whose pages are marked as the real one."""
+    lines = []
+    for page in range(1, num_pages):
+        lines += [f"Chapter {page} describes the data"] * (page % 7 + 1)
+        lines += [f"{page}", "● ソフトウェア開発データ白書2018-2019"]
+    text = "\n".join(lines) + "\n"
+    file_path.write_text(text, encoding="utf-8")
+    return text
+
+
+SPECIFIC_STRINGS = ["ソフトウェア開発データ白書", "● ソフトウェア開発データ白書"]
+
+
+def test_iter_documents(tmp_path):
+    """Tests whether streaming the file agrees with processing it as a whole."""
+    processor = TextProcessor(
+        embedding_model="text-embedding-3-small", knowledge_path=""
+    )
+    file_path = tmp_path.joinpath("whitepaper.txt")
+    text = _write_whitepaper(file_path)
+    expected_text = processor.clean_text(
+        processor.insert_newlines(text, SPECIFIC_STRINGS)
+    )
+    expected_docs = processor.split_text_into_chunks(expected_text)
+    docs = list(processor.iter_documents(file_path, SPECIFIC_STRINGS, block_size=100))
+    assert [doc.page_content for doc in docs] == [
+        doc.page_content for doc in expected_docs
+    ]
+    assert all(doc.metadata["source"] == "whitepaper.txt" for doc in docs)
+    # NOTE: 最初のマーカーより前のチャンクにはページ番号がない
+    assert "page" not in docs[0].metadata
+    # NOTE: 以降のチャンクは、ページ番号のマーカーから始まる
+    assert all(
+        doc.page_content.startswith(f"{doc.metadata['page']}●") for doc in docs[1:]
+    )
+    assert [doc.metadata["page"] for doc in docs[1:]] == sorted(
+        doc.metadata["page"] for doc in docs[1:]
+    )
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="fork unavailable"
+)
+def test_iter_corpus_documents(tmp_path):
+    """Tests whether the process pool yields the chunks of each file in order."""
+    processor = TextProcessor(
+        embedding_model="text-embedding-3-small", knowledge_path=""
+    )
+    file_paths = [tmp_path.joinpath(f"whitepaper{i}.txt") for i in range(5)]
+    for i, file_path in enumerate(file_paths):
+        _write_whitepaper(file_path, num_pages=20 + 10 * i)
+    expected_docs = list(
+        processor.iter_corpus_documents(file_paths, SPECIFIC_STRINGS, max_processes=1)
+    )
+    # NOTE: spawnのワーカーはpytestの `__main__` を読み込み直すので、forkで起動する
+    docs = list(
+        processor.iter_corpus_documents(
+            file_paths,
+            SPECIFIC_STRINGS,
+            max_processes=2,
+            mp_context=multiprocessing.get_context("fork"),
+        )
+    )
+    assert docs == expected_docs
+    assert [doc.metadata["source"] for doc in docs] == sorted(
+        doc.metadata["source"] for doc in docs
+    )
+    assert len({chunk_id(doc) for doc in docs}) == len(docs)
+
+
+def test_resolve_sources(tmp_path):
+    for name in ["a.txt", "b.txt", "sub/c.txt", "d.md"]:
+        tmp_path.joinpath(name).parent.mkdir(exist_ok=True)
+        tmp_path.joinpath(name).write_text("", encoding="utf-8")
+    assert resolve_sources([str(tmp_path)]) == [
+        tmp_path.joinpath("a.txt"),
+        tmp_path.joinpath("b.txt"),
+    ]
+    assert resolve_sources(
+        [str(tmp_path.joinpath("**", "*.txt")), str(tmp_path.joinpath("a.txt"))]
+    ) == [
+        tmp_path.joinpath("a.txt"),
+        tmp_path.joinpath("b.txt"),
+        tmp_path.joinpath("sub", "c.txt"),
+    ]
+    with pytest.raises(ValueError):
+        resolve_sources([str(tmp_path.joinpath("*.csv"))])
+
+
+def test_db_paths_without_rag_txt_path(tmp_path, monkeypatch):
+    """Tests whether the database can be located without `RAG_TXT_PATH`."""
+    monkeypatch.delenv("RAG_TXT_PATH", raising=False)
+    monkeypatch.delenv("RAG_EMBD_CACHE_PATH", raising=False)
+    monkeypatch.setenv("RAG_TXT_DB_PATH", str(tmp_path.joinpath("corpus_chroma_db")))
+    assert get_ipa_db_path() == tmp_path.joinpath("corpus_chroma_db")
+    assert get_embedding_cache_path() == tmp_path.joinpath("corpus_embeddings.sqlite3")
+    assert get_embedding_cache_path(tmp_path.joinpath("db")) == tmp_path.joinpath(
+        "db_embeddings.sqlite3"
+    )
+    monkeypatch.delenv("RAG_TXT_DB_PATH")
+    with pytest.raises(SystemExit):
+        main([str(tmp_path)])
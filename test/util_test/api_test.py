@@ -1,3 +1,6 @@
+import asyncio
+import time
+
 import pytest
 
 from util.api import (
@@ -6,9 +9,13 @@ from util.api import (
     TEMPERAURE,
     APIType,
     AzureOpenAIAPIConfig,
+    ClientPool,
     InvalidAPIError,
     OpenAIAPIConfig,
+    ValidationCache,
+    ValidationMode,
     has_valid_openai_api_from_env,
+    validation_cache,
 )
 
 
@@ -23,9 +30,76 @@ def test_APIType():
         assert api.name == api.value.name
 
 
+def test_client_pool():
+    pool = ClientPool(maxsize=2)
+    first = pool.get(("a", "client"), object)
+    assert pool.get(("a", "client"), object) is first
+    pool.get(("b", "client"), object)
+    pool.get(("a", "client"), object)  # NOTE: "a"が最近使われたことになる
+    pool.get(("c", "client"), object)
+    assert len(pool) == 2
+    assert ("a", "client") in pool
+    assert ("b", "client") not in pool
+    assert pool.http_client is pool.http_client
+    pool.clear()
+    assert len(pool) == 0
+
+
+def test_client_pool_async():
+    """Tests whether the async objects are pooled per event loop."""
+    pool = ClientPool()
+
+    async def get():
+        first = pool.get_async(("a", "client"), object)
+        assert pool.get_async(("a", "client"), object) is first
+        return first
+
+    assert asyncio.run(get()) is not asyncio.run(get())
+    assert len(pool) == 0
+    with pytest.raises(RuntimeError):
+        pool.get_async(("a", "client"), object)  # NOTE: イベントループの外
+
+
+def test_validation_cache():
+    cache = ValidationCache(ttl=0.05)
+    assert "key" not in cache
+    cache.add("key")
+    assert "key" in cache
+    time.sleep(0.1)
+    assert "key" not in cache
+
+
 def test_invalid_openai_api_config():
     with pytest.raises(InvalidAPIError):
         OpenAIAPIConfig(openai_api_key="obviously_invalid_key")
+    with pytest.raises(InvalidAPIError):
+        OpenAIAPIConfig(
+            openai_api_key="obviously_invalid_key",
+            validation_mode=ValidationMode.EAGER,
+        )
+
+
+def test_lazy_openai_api_config():
+    # NOTE: LAZYの場合、インスタンス化の時点では検証しない
+    api_config = OpenAIAPIConfig(
+        openai_api_key="obviously_invalid_key", validation_mode=ValidationMode.LAZY
+    )
+    with pytest.raises(InvalidAPIError):
+        api_config.init_openai_client()
+
+
+def test_cached_openai_api_config():
+    lazy_config = OpenAIAPIConfig(
+        openai_api_key="cached_key", validation_mode=ValidationMode.LAZY
+    )
+    validation_cache.add(lazy_config.validation_key())
+    try:
+        # NOTE: 検証済みの設定に対しては、APIへのリクエストを行わない
+        api_config = OpenAIAPIConfig(openai_api_key="cached_key")
+        assert api_config == lazy_config
+        assert api_config.init_openai_client() is lazy_config.init_openai_client()
+    finally:
+        validation_cache.clear()
 
 
 @pytest.mark.skipif(
@@ -63,4 +137,25 @@ def test_valid_azure_openai_api():
         AzureOpenAIAPIConfig(azure_openai_api_key="obviously_valid_key")
 
 
+def test_azure_openai_api_config_models():
+    """Tests whether the Azure OpenAI clients and models can be built."""
+    # NOTE: Azure OpenAIは検証でAPIにリクエストしないので、偽の設定でもよい
+    api_config = AzureOpenAIAPIConfig(
+        azure_openai_api_key="fake_key",
+        azure_openai_endpoint="https://example.openai.azure.com",
+    )
+    try:
+        assert api_config.init_openai_client() is api_config.init_openai_client()
+        assert api_config.init_chat_model() is api_config.init_chat_model()
+        assert api_config.init_embd_model() is api_config.init_embd_model()
+
+        async def init_async():
+            api_config.init_async_openai_client()
+            api_config.init_async_chat_model()
+
+        asyncio.run(init_async())
+    finally:
+        validation_cache.clear()
+
+
 # TODO: Add equivalent test functions for Azure OpenAI
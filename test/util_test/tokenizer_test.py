@@ -0,0 +1,8 @@
+from util.tokenizer import get_encoding
+
+
+def test_get_encoding():
+    assert get_encoding("gpt-4o").name == "o200k_base"
+    assert get_encoding("unknown-model").name == "cl100k_base"
+    assert get_encoding("unknown-model", "o200k_base").name == "o200k_base"
+    assert get_encoding("gpt-4o") is get_encoding("gpt-4o")